@@ -322,6 +322,9 @@ CORS_ALLOW_ORIGINS = resolve_cors_allow_origins(
 # OpenRouter API endpoint
 OPENROUTER_API_URL = "https://openrouter.ai/api/v1/chat/completions"
 
+# Max concurrent OpenRouter requests per worker process, across all users
+LLM_CONCURRENCY = max(1, int(os.getenv("LLM_CONCURRENCY") or "32"))
+
 # Stripe configuration
 STRIPE_SECRET_KEY = os.getenv("STRIPE_API_KEY_SECRET")
 STRIPE_PUBLIC_KEY = os.getenv("STRIPE_API_KEY_PUBLIC")
@@ -6,7 +6,11 @@ from typing import Any, Dict, List, Tuple
 from .stages import (
     calculate_aggregate_rankings,
     empty_usage_summary,
+    fold_title_usage,
     generate_conversation_title,
+    has_call_usage,
+    history_to_context_text,
+    merge_usage_summaries,
     parse_ranking_from_text,
     stage1_collect_responses,
     stage2_collect_rankings,
@@ -85,6 +89,10 @@ async def run_full_council(
 
 __all__ = [
     "empty_usage_summary",
+    "fold_title_usage",
+    "has_call_usage",
+    "history_to_context_text",
+    "merge_usage_summaries",
     "summarize_council_usage",
     "stage1_collect_responses",
     "stage2_collect_rankings",
@@ -10,6 +10,7 @@ import tempfile
 from pathlib import Path
 from typing import Any, Dict, List
 
+import orjson
 from fastapi import HTTPException, Request, UploadFile
 from starlette.datastructures import UploadFile as StarletteUploadFile
 
@@ -168,7 +169,7 @@ async def extract_message_content_and_files(
         return content, files
 
     try:
-        payload = await http_request.json()
+        payload = orjson.loads(await http_request.body())
     except Exception:
         payload = {}
 
@@ -2,15 +2,17 @@
 
 from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response, StreamingResponse
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any
+from starlette.background import BackgroundTask
+from typing import Any, AsyncIterator, Dict, List
 from datetime import datetime, timedelta, timezone
-from contextlib import suppress
+from contextlib import asynccontextmanager, suppress
 import uuid
-import json
 import asyncio
+import time
+import orjson
 from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 from .services.supabase import storage
@@ -26,6 +28,9 @@ from .services.supabase.auth import (
     update_user_plan_metadata,
     update_user_role_metadata,
 )
+from .services.openrouter.client import close_openrouter_client
+from .services.stripe.client import close_stripe_client
+from .services.supabase.rest import close_supabase_rest_client
 from .services.stripe.billing import (
     confirm_checkout_session as confirm_stripe_checkout_session,
     create_pro_checkout_session as create_stripe_pro_checkout_session,
@@ -39,6 +44,10 @@ from .council import (
     calculate_aggregate_rankings,
     summarize_council_usage,
     empty_usage_summary,
+    fold_title_usage,
+    has_call_usage,
+    history_to_context_text,
+    merge_usage_summaries,
 )
 from .config import (
     STRIPE_PUBLIC_KEY,
@@ -60,7 +69,19 @@ from .files import (
 from .utils import normalize_plan as _normalize_plan
 from .utils import normalize_session_id as _normalize_session_id
 
-app = FastAPI(title="LLM Council API", debug=True)
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    """Release pooled outbound HTTP clients on shutdown."""
+    yield
+    await asyncio.gather(
+        close_openrouter_client(),
+        close_stripe_client(),
+        close_supabase_rest_client(),
+    )
+
+
+app = FastAPI(title="LLM Council API", debug=True, lifespan=lifespan)
 bearer_scheme = HTTPBearer()
 FREE_PLAN_LIMIT_ERROR_CODE = "FREE_DAILY_QUERY_LIMIT_REACHED"
 DEFAULT_DAILY_RESET_TIMEZONE = "UTC"
@@ -68,6 +89,12 @@ FREE_WEB_SEARCH_MAX_RESULTS = 2
 PRO_WEB_SEARCH_MAX_RESULTS = 5
 FEEDBACK_MESSAGE_MAX_LENGTH = 4000
 ADMIN_FEEDBACK_MAX_LIMIT = 500
+MAX_INFLIGHT_MESSAGES_PER_USER = 5
+INFLIGHT_MESSAGE_WINDOW_SECONDS = 300
+_SSE_PREFIX = b"data: "
+_SSE_SUFFIX = b"\n\n"
+# user id -> {request id: monotonic start time} for council runs in progress.
+_inflight_messages: Dict[str, Dict[str, float]] = {}
 
 # Configure CORS from backend config (dev localhost defaults, explicit production origins).
 app.add_middleware(
@@ -76,6 +103,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Chromium caps preflight caching at two hours; let browsers reuse it that long.
+    max_age=7200,
 )
 
 
@@ -99,6 +128,8 @@ class Conversation(BaseModel):
     archived: bool = False
     messages: List[Dict[str, Any]]
     usage: Dict[str, Any] = Field(default_factory=dict)
+    has_more: bool = False
+    next_before_id: int | None = None
 
 
 class AuthRequest(BaseModel):
@@ -526,8 +557,13 @@ def _build_conversation_history(
     if not isinstance(messages, list):
         return []
 
+    # Walk newest-first so long conversations stop scanning once the retained
+    # window (message count or character budget) is full.
     history: List[Dict[str, str]] = []
-    for message in messages:
+    running_chars = 0
+    for message in reversed(messages):
+        if len(history) >= max_messages:
+            break
         if not isinstance(message, dict):
             continue
 
@@ -555,28 +591,14 @@ def _build_conversation_history(
                     text = raw_text
 
         if role in {"user", "assistant"} and text:
-            history.append(
-                {
-                    "role": role,
-                    "content": _compress_message_content(text, max_chars_per_message),
-                }
-            )
-
-    if len(history) > max_messages:
-        history = history[-max_messages:]
-
-    bounded: List[Dict[str, str]] = []
-    running_chars = 0
-    for item in reversed(history):
-        content = item["content"]
-        next_size = len(content)
-        if bounded and running_chars + next_size > max_total_chars:
-            break
-        bounded.append(item)
-        running_chars += next_size
+            content = _compress_message_content(text, max_chars_per_message)
+            if history and running_chars + len(content) > max_total_chars:
+                break
+            history.append({"role": role, "content": content})
+            running_chars += len(content)
 
-    bounded.reverse()
-    return bounded
+    history.reverse()
+    return history
 
 
 def _resolve_conversation_session_id(conversation: Dict[str, Any]) -> str:
@@ -605,6 +627,51 @@ def _resolve_conversation_session_id(conversation: Dict[str, Any]) -> str:
     return str(uuid.uuid4())
 
 
+def _sse_event(payload: Dict[str, Any]) -> bytes:
+    """Encode one Server-Sent Events frame."""
+    return _SSE_PREFIX + orjson.dumps(payload, default=str) + _SSE_SUFFIX
+
+
+def _trusted_json_response(payload: Any) -> Response:
+    """Serialize storage-shaped rows with orjson, bypassing response-model validation."""
+    return Response(content=orjson.dumps(payload), media_type="application/json")
+
+
+_SSE_STAGE1_START = _sse_event({"type": "stage1_start"})
+_SSE_STAGE2_START = _sse_event({"type": "stage2_start"})
+_SSE_STAGE3_START = _sse_event({"type": "stage3_start"})
+
+
+def _acquire_message_slot(user_id: str) -> str:
+    """Reserve an in-flight council run for the user, or reject with 429."""
+    now = time.monotonic()
+    slots = _inflight_messages.setdefault(user_id, {})
+    # Slots older than the window belong to runs that never released them.
+    for request_id, started_at in list(slots.items()):
+        if now - started_at > INFLIGHT_MESSAGE_WINDOW_SECONDS:
+            del slots[request_id]
+
+    if len(slots) >= MAX_INFLIGHT_MESSAGES_PER_USER:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many messages in progress. Wait for a reply before sending another.",
+        )
+
+    request_id = uuid.uuid4().hex
+    slots[request_id] = now
+    return request_id
+
+
+def _release_message_slot(user_id: str, request_id: str) -> None:
+    """Release a slot taken by _acquire_message_slot."""
+    slots = _inflight_messages.get(user_id)
+    if slots is None:
+        return
+    slots.pop(request_id, None)
+    if not slots:
+        _inflight_messages.pop(user_id, None)
+
+
 def _resolve_openrouter_user_identifier(user: Dict[str, Any]) -> str | None:
     """Resolve outbound OpenRouter user identifier (email first, id fallback)."""
     email = user.get("email")
@@ -643,9 +710,20 @@ async def get_current_admin_user(
     return user
 
 
-async def get_owned_conversation(conversation_id: str, user_id: str):
+async def get_owned_conversation(
+    conversation_id: str,
+    user_id: str,
+    *,
+    limit: int | None = None,
+    before_id: int | None = None,
+):
     """Return conversation only when it belongs to the current user."""
-    conversation = await storage.get_conversation(conversation_id, user_id)
+    conversation = await storage.get_conversation(
+        conversation_id,
+        user_id,
+        limit=limit,
+        before_id=before_id,
+    )
     if conversation is None:
         raise HTTPException(status_code=404, detail="Conversation not found")
     return conversation
@@ -688,22 +766,26 @@ async def me(user: Dict[str, Any] = Depends(get_current_user)):
     return {"user": user}
 
 
+# Pricing and the publishable key only change on deploy, so build the payload once.
+_BILLING_CONFIG_PAYLOAD: Dict[str, Any] = {
+    "stripe_public_key": STRIPE_PUBLIC_KEY or "",
+    "plans": [
+        {"id": "free", "name": "Free", "price_brl": 0},
+        {
+            "id": "pro",
+            "name": "Pro",
+            "price_brl": PRO_PLAN_PRICE_BRL_CENTS // 100,
+            "price_brl_cents": PRO_PLAN_PRICE_BRL_CENTS,
+            "interval": "month",
+        },
+    ],
+}
+
+
 @app.get("/api/billing/config")
 async def get_billing_config(user: Dict[str, Any] = Depends(get_current_user)):
     """Return pricing and Stripe publishable key for the frontend."""
-    return {
-        "stripe_public_key": STRIPE_PUBLIC_KEY or "",
-        "plans": [
-            {"id": "free", "name": "Free", "price_brl": 0},
-            {
-                "id": "pro",
-                "name": "Pro",
-                "price_brl": PRO_PLAN_PRICE_BRL_CENTS // 100,
-                "price_brl_cents": PRO_PLAN_PRICE_BRL_CENTS,
-                "interval": "month",
-            },
-        ],
-    }
+    return _BILLING_CONFIG_PAYLOAD
 
 
 @app.post("/api/billing/checkout/pro")
@@ -771,13 +853,17 @@ async def get_account_summary(user: Dict[str, Any] = Depends(get_current_user)):
     }
 
 
-@app.get("/api/account/payments", response_model=List[BillingPaymentResponse])
+@app.get(
+    "/api/account/payments",
+    response_class=Response,
+    responses={200: {"model": List[BillingPaymentResponse]}},
+)
 async def get_account_payments(
     limit: int = Query(default=50, ge=1, le=200),
     user: Dict[str, Any] = Depends(get_current_user),
 ):
     """Return processed Stripe payments linked to the authenticated account."""
-    return await storage.list_billing_payments(user["id"], limit)
+    return _trusted_json_response(await storage.list_billing_payments(user["id"], limit))
 
 
 @app.post("/api/feedback", response_model=FeedbackResponse)
@@ -899,13 +985,19 @@ async def add_credits(
     )
 
 
-@app.get("/api/conversations", response_model=List[ConversationMetadata])
+@app.get(
+    "/api/conversations",
+    response_class=Response,
+    responses={200: {"model": List[ConversationMetadata]}},
+)
 async def list_conversations(
     archived: bool = Query(default=False),
     user: Dict[str, Any] = Depends(get_current_user),
 ):
     """List all conversations (metadata only)."""
-    return await storage.list_conversations(user["id"], archived=archived)
+    return _trusted_json_response(
+        await storage.list_conversations(user["id"], archived=archived)
+    )
 
 
 @app.post("/api/conversations", response_model=Conversation)
@@ -938,10 +1030,23 @@ async def create_conversation(
 @app.get("/api/conversations/{conversation_id}", response_model=Conversation)
 async def get_conversation(
     conversation_id: str,
+    limit: int | None = Query(default=None, ge=1, le=200),
+    before_id: int | None = Query(default=None, ge=1),
     user: Dict[str, Any] = Depends(get_current_user),
 ):
-    """Get a specific conversation with all its messages."""
-    conversation = await get_owned_conversation(conversation_id, user["id"])
+    """
+    Get a specific conversation with its messages.
+
+    Without ``limit`` the full history is returned. With it, only the newest
+    ``limit`` messages (older than ``before_id`` when given) are returned and
+    ``usage`` covers that page; pass ``next_before_id`` back to load more.
+    """
+    conversation = await get_owned_conversation(
+        conversation_id,
+        user["id"],
+        limit=limit,
+        before_id=before_id,
+    )
     return conversation
 
 
@@ -976,28 +1081,54 @@ async def send_message(
     Send a message and run the 3-stage council process.
     Returns the complete response with all stages.
     """
+    slot_id = _acquire_message_slot(user["id"])
+    try:
+        return await _run_message_turn(
+            conversation_id, http_request, user_timezone, web_search, user
+        )
+    finally:
+        _release_message_slot(user["id"], slot_id)
+
+
+async def _run_message_turn(
+    conversation_id: str,
+    http_request: Request,
+    user_timezone: str | None,
+    web_search: str | None,
+    user: Dict[str, Any],
+):
+    """Run the council for one message and persist the resulting turn."""
     message_content, incoming_files = await extract_message_content_and_files(
         http_request
     )
     if not message_content.strip() and not incoming_files:
         raise HTTPException(status_code=400, detail="Message text or file is required.")
 
-    # Check if conversation exists
-    conversation = await get_owned_conversation(conversation_id, user["id"])
+    plan = _get_user_plan(user)
+    remaining_tokens = 0
+    if plan == "pro":
+        # The PRO balance does not depend on the conversation; load both at once.
+        conversation, remaining_tokens = await asyncio.gather(
+            get_owned_conversation(conversation_id, user["id"]),
+            _get_remaining_daily_tokens(user),
+        )
+    else:
+        # Check if conversation exists
+        conversation = await get_owned_conversation(conversation_id, user["id"])
 
     # Check if this is the first message
     is_first_message = len(conversation["messages"]) == 0
     conversation_history = _build_conversation_history(conversation.get("messages", []))
+    # Stages 2 and 3 embed the same rendered history; build it once per turn.
+    conversation_context_text = history_to_context_text(conversation_history)
     conversation_session_id = _resolve_conversation_session_id(conversation)
     openrouter_user = _resolve_openrouter_user_identifier(user)
-    plan = _get_user_plan(user)
     council_models = get_council_models_for_plan(plan)
     chairman_model = get_chairman_model_for_plan(plan)
     resolved_timezone = _resolve_user_timezone(user, user_timezone)
     remaining_balance_after = 0
 
     if plan == "pro":
-        remaining_tokens = await _get_remaining_daily_tokens(user)
         if remaining_tokens <= 0:
             raise HTTPException(
                 status_code=402,
@@ -1021,163 +1152,194 @@ async def send_message(
     )
     defer_first_message_persistence = plan == "free" and is_first_message
 
-    if not defer_first_message_persistence:
-        await storage.add_user_message(
-            conversation_id,
-            user["id"],
-            message_content,
-            files=safe_user_files,
-            id_session=conversation_session_id,
-        )
-
-    # If this is the first message, generate a title
-    title_usage = empty_usage_summary()
-    if is_first_message and not defer_first_message_persistence:
-        title_result = await generate_conversation_title(
-            resolved_prompt,
-            session_id=conversation_session_id,
-            openrouter_user=openrouter_user,
-        )
-        title = title_result.get("title", "New Conversation")
-        title_usage = title_result.get("usage", empty_usage_summary())
-        await storage.update_conversation_title(conversation_id, user["id"], title)
-
-    # Stage 1
-    stage1_results = await stage1_collect_responses(
-        resolved_prompt,
-        conversation_history=conversation_history,
-        session_id=conversation_session_id,
-        openrouter_user=openrouter_user,
-        user_attachments=attachment_parts,
-        plugins=request_plugins,
-        council_models=council_models,
-    )
-
-    # Free plan: consume one query only after Stage 1 has at least one successful response.
-    if defer_first_message_persistence and stage1_results:
-        try:
-            remaining_balance_after = await storage.consume_account_tokens(
-                user["id"],
-                1,
-                FREE_DAILY_QUERY_LIMIT,
-                timezone_name=resolved_timezone,
-            )
-        except ValueError:
-            _raise_free_daily_query_limit_error(resolved_timezone)
+    # The user message is kept if the turn fails, except for a free first
+    # message that has not consumed its query yet.
+    user_message_persistable = not defer_first_message_persistence
+    user_message_saved = False
+    title_task: asyncio.Task | None = None
 
-    if defer_first_message_persistence:
-        await storage.add_user_message(
+    async def persist_turn() -> Dict[str, Any]:
+        """Persist the turn and return the reply's usage."""
+        nonlocal user_message_saved
+        message_usage = await storage.append_turn(
             conversation_id,
             user["id"],
             message_content,
+            stage1_results,
+            stage2_results,
+            stage3_result,
             files=safe_user_files,
             id_session=conversation_session_id,
         )
+        user_message_saved = True
+        return message_usage
 
-        title_result = await generate_conversation_title(
-            resolved_prompt,
-            session_id=conversation_session_id,
-            openrouter_user=openrouter_user,
-        )
-        title = title_result.get("title", "New Conversation")
-        title_usage = title_result.get("usage", empty_usage_summary())
-        await storage.update_conversation_title(conversation_id, user["id"], title)
-
-    stage2_results: List[Dict[str, Any]] = []
-    if not stage1_results:
-        stage3_result = {
-            "model": "error",
-            "response": "All models failed to respond. Please try again.",
-            "usage": empty_usage_summary(),
-        }
-        metadata = {
-            "label_to_model": {},
-            "aggregate_rankings": [],
-            "usage": summarize_council_usage(
-                stage1_results, stage2_results, stage3_result
-            ),
-        }
-    else:
-        # Stage 2
-        stage2_results, label_to_model = await stage2_collect_rankings(
-            resolved_prompt,
-            stage1_results,
-            conversation_history=conversation_history,
-            session_id=conversation_session_id,
-            council_models=council_models,
-            openrouter_user=openrouter_user,
-        )
-        aggregate_rankings = calculate_aggregate_rankings(
-            stage2_results, label_to_model
-        )
+    try:
+        # If this is the first message, generate a title alongside the council
+        # stages; it is only needed once the turn is persisted.
+        if is_first_message and not defer_first_message_persistence:
+            title_task = asyncio.create_task(
+                generate_conversation_title(
+                    resolved_prompt,
+                    session_id=conversation_session_id,
+                    openrouter_user=openrouter_user,
+                )
+            )
 
-        # Stage 3
-        stage3_result = await stage3_synthesize_final(
+        # Stage 1
+        stage1_results = await stage1_collect_responses(
             resolved_prompt,
-            stage1_results,
-            stage2_results,
             conversation_history=conversation_history,
             session_id=conversation_session_id,
             openrouter_user=openrouter_user,
             user_attachments=attachment_parts,
             plugins=request_plugins,
-            chairman_model=chairman_model,
+            council_models=council_models,
         )
-        metadata = {
-            "label_to_model": label_to_model,
-            "aggregate_rankings": aggregate_rankings,
-            "usage": summarize_council_usage(
-                stage1_results, stage2_results, stage3_result
-            ),
-        }
-
-    if is_first_message:
-        metadata["title_usage"] = title_usage
-        metadata_usage = metadata.get("usage", empty_usage_summary())
-        metadata["usage"] = {
-            "input_tokens": int(metadata_usage.get("input_tokens", 0))
-            + int(title_usage.get("input_tokens", 0)),
-            "output_tokens": int(metadata_usage.get("output_tokens", 0))
-            + int(title_usage.get("output_tokens", 0)),
-            "total_tokens": int(metadata_usage.get("total_tokens", 0))
-            + int(title_usage.get("total_tokens", 0)),
-            "total_cost": round(
-                float(metadata_usage.get("total_cost", 0.0))
-                + float(title_usage.get("cost", 0.0) or 0.0),
-                8,
-            ),
-            "model_calls": int(metadata_usage.get("model_calls", 0)) + 1,
-        }
-        stage3_result["title_usage"] = title_usage
 
-    if plan == "pro":
-        tokens_to_consume = max(
-            0, int((metadata.get("usage") or {}).get("total_tokens", 0))
-        )
-        try:
-            remaining_balance_after = await storage.consume_account_tokens(
-                user["id"],
-                tokens_to_consume,
-                PRO_DAILY_TOKEN_CREDITS,
+        # Free plan: consume one query only after Stage 1 has at least one successful response.
+        if defer_first_message_persistence and stage1_results:
+            try:
+                remaining_balance_after = await storage.consume_account_tokens(
+                    user["id"],
+                    1,
+                    FREE_DAILY_QUERY_LIMIT,
+                    timezone_name=resolved_timezone,
+                )
+            except ValueError:
+                _raise_free_daily_query_limit_error(resolved_timezone)
+
+        if defer_first_message_persistence:
+            user_message_persistable = True
+            # Free first messages only spend a title call once the quota is consumed.
+            title_task = asyncio.create_task(
+                generate_conversation_title(
+                    resolved_prompt,
+                    session_id=conversation_session_id,
+                    openrouter_user=openrouter_user,
+                )
             )
-        except ValueError as error:
-            raise HTTPException(status_code=402, detail=str(error)) from error
-    elif not is_first_message:
-        # Existing conversation continuation stays allowed and does not consume a new free query.
-        remaining_balance_after = await _get_remaining_daily_queries(
-            user, resolved_timezone
-        )
 
-    # Add assistant message with all stages
-    await storage.add_assistant_message(
-        conversation_id,
-        user["id"],
-        stage1_results,
-        stage2_results,
-        stage3_result,
-        id_session=conversation_session_id,
-    )
-    updated_conversation = await storage.get_conversation(conversation_id, user["id"])
+        stage2_results: List[Dict[str, Any]] = []
+        if not stage1_results:
+            stage3_result = {
+                "model": "error",
+                "response": "All models failed to respond. Please try again.",
+                "usage": empty_usage_summary(),
+            }
+            metadata = {
+                "label_to_model": {},
+                "aggregate_rankings": [],
+                "usage": summarize_council_usage(
+                    stage1_results, stage2_results, stage3_result
+                ),
+            }
+        else:
+            # Stage 2
+            stage2_results, label_to_model = await stage2_collect_rankings(
+                resolved_prompt,
+                stage1_results,
+                conversation_history=conversation_history,
+                session_id=conversation_session_id,
+                council_models=council_models,
+                openrouter_user=openrouter_user,
+                conversation_context_text=conversation_context_text,
+            )
+            aggregate_rankings = calculate_aggregate_rankings(
+                stage2_results, label_to_model
+            )
+
+            # Stage 3
+            stage3_result = await stage3_synthesize_final(
+                resolved_prompt,
+                stage1_results,
+                stage2_results,
+                conversation_history=conversation_history,
+                session_id=conversation_session_id,
+                openrouter_user=openrouter_user,
+                user_attachments=attachment_parts,
+                plugins=request_plugins,
+                chairman_model=chairman_model,
+                conversation_context_text=conversation_context_text,
+            )
+            metadata = {
+                "label_to_model": label_to_model,
+                "aggregate_rankings": aggregate_rankings,
+                "usage": summarize_council_usage(
+                    stage1_results, stage2_results, stage3_result
+                ),
+            }
+
+        title: str | None = None
+        title_usage = empty_usage_summary()
+        if title_task is not None:
+            title_result = await title_task
+            title = title_result.get("title", "New Conversation")
+            title_usage = title_result.get("usage", empty_usage_summary())
+
+        if is_first_message:
+            metadata["title_usage"] = title_usage
+            metadata["usage"] = fold_title_usage(metadata.get("usage"), title_usage)
+            # Stored message usage counts every title_usage dict as a model call,
+            # so only persist it when the fold above counted it too.
+            if has_call_usage(title_usage):
+                stage3_result["title_usage"] = title_usage
+
+        if plan == "pro":
+            tokens_to_consume = max(
+                0, int((metadata.get("usage") or {}).get("total_tokens", 0))
+            )
+            try:
+                remaining_balance_after = await storage.consume_account_tokens(
+                    user["id"],
+                    tokens_to_consume,
+                    PRO_DAILY_TOKEN_CREDITS,
+                )
+            except ValueError as error:
+                raise HTTPException(status_code=402, detail=str(error)) from error
+        elif not is_first_message:
+            # Existing conversation continuation stays allowed and does not consume a new free query.
+            remaining_balance_after = await _get_remaining_daily_queries(
+                user, resolved_timezone
+            )
+
+        # Persist the user message and the assistant reply with all stages together.
+        if title is None:
+            message_usage = await persist_turn()
+        else:
+            # Let both writes settle so neither is left running unobserved,
+            # then surface the first failure.
+            message_usage, title_saved = await asyncio.gather(
+                persist_turn(),
+                storage.update_conversation_title(conversation_id, user["id"], title),
+                return_exceptions=True,
+            )
+            for outcome in (message_usage, title_saved):
+                if isinstance(outcome, BaseException):
+                    raise outcome
+    except Exception:
+        if user_message_persistable and not user_message_saved:
+            # Keep the user's message even though the turn failed part-way.
+            with suppress(Exception):
+                await storage.add_user_message(
+                    conversation_id,
+                    user["id"],
+                    message_content,
+                    files=safe_user_files,
+                    id_session=conversation_session_id,
+                )
+        raise
+    finally:
+        if title_task is not None:
+            # No-op after a successful turn; on failure this stops the title
+            # call and retrieves its outcome so the task is not orphaned.
+            title_task.cancel()
+            with suppress(asyncio.CancelledError, Exception):
+                await title_task
+
+    # Running total from the conversation fetched at entry plus the usage the
+    # storage layer recorded for this turn, instead of re-reading the conversation.
+    conversation_usage = merge_usage_summaries(conversation.get("usage"), message_usage)
 
     # Return the complete response with metadata
     return {
@@ -1186,9 +1348,7 @@ async def send_message(
         "stage3": stage3_result,
         "metadata": metadata,
         "credits": remaining_balance_after,
-        "conversation_usage": (updated_conversation or {}).get(
-            "usage", empty_usage_summary()
-        ),
+        "conversation_usage": conversation_usage,
     }
 
 
@@ -1204,28 +1364,58 @@ async def send_message_stream(
     Send a message and stream the 3-stage council process.
     Returns Server-Sent Events as each stage completes.
     """
+    # Reserve the slot before any upload parsing or storage work, and give it
+    # back if the response is never built.
+    slot_id = _acquire_message_slot(user["id"])
+    try:
+        return await _build_message_stream(
+            conversation_id, http_request, user_timezone, web_search, user, slot_id
+        )
+    except BaseException:
+        _release_message_slot(user["id"], slot_id)
+        raise
+
+
+async def _build_message_stream(
+    conversation_id: str,
+    http_request: Request,
+    user_timezone: str | None,
+    web_search: str | None,
+    user: Dict[str, Any],
+    slot_id: str,
+) -> StreamingResponse:
+    """Prepare one streamed message turn and return its SSE response."""
     message_content, incoming_files = await extract_message_content_and_files(
         http_request
     )
     if not message_content.strip() and not incoming_files:
         raise HTTPException(status_code=400, detail="Message text or file is required.")
 
-    # Check if conversation exists
-    conversation = await get_owned_conversation(conversation_id, user["id"])
+    plan = _get_user_plan(user)
+    remaining_tokens = 0
+    if plan == "pro":
+        # The PRO balance does not depend on the conversation; load both at once.
+        conversation, remaining_tokens = await asyncio.gather(
+            get_owned_conversation(conversation_id, user["id"]),
+            _get_remaining_daily_tokens(user),
+        )
+    else:
+        # Check if conversation exists
+        conversation = await get_owned_conversation(conversation_id, user["id"])
 
     # Check if this is the first message
     is_first_message = len(conversation["messages"]) == 0
     conversation_history = _build_conversation_history(conversation.get("messages", []))
+    # Stages 2 and 3 embed the same rendered history; build it once per turn.
+    conversation_context_text = history_to_context_text(conversation_history)
     conversation_session_id = _resolve_conversation_session_id(conversation)
     openrouter_user = _resolve_openrouter_user_identifier(user)
-    plan = _get_user_plan(user)
     council_models = get_council_models_for_plan(plan)
     chairman_model = get_chairman_model_for_plan(plan)
     resolved_timezone = _resolve_user_timezone(user, user_timezone)
     remaining_balance_after = 0
 
     if plan == "pro":
-        remaining_tokens = await _get_remaining_daily_tokens(user)
         if remaining_tokens <= 0:
             raise HTTPException(
                 status_code=402,
@@ -1248,7 +1438,7 @@ async def send_message_stream(
         plan=plan,
     )
 
-    async def event_generator():
+    async def event_generator() -> AsyncIterator[bytes]:
         remaining_balance_current = remaining_balance_after
         stage1_results: List[Dict[str, Any]] = []
         stage2_results: List[Dict[str, Any]] = []
@@ -1288,7 +1478,8 @@ async def send_message_stream(
             wait_for_title: bool = False,
             save_title: bool = True,
         ) -> tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any] | None]:
-            nonlocal remaining_balance_current, stage3_result
+            """Persist the turn and return (metadata, conversation usage, title)."""
+            nonlocal remaining_balance_current, stage3_result, user_message_saved
             nonlocal stage1_started, stage2_started, stage3_started
 
             resolved_title = title_result
@@ -1320,97 +1511,90 @@ async def send_message_stream(
                 ),
             }
 
+            title_update: asyncio.Task | None = None
             if isinstance(resolved_title, dict):
                 title = resolved_title.get("title", "New Conversation")
                 title_usage = resolved_title.get("usage", empty_usage_summary())
                 if save_title:
-                    await storage.update_conversation_title(
-                        conversation_id, user["id"], title
+                    # Overlaps with quota accounting and the turn insert below.
+                    title_update = asyncio.create_task(
+                        storage.update_conversation_title(
+                            conversation_id, user["id"], title
+                        )
                     )
 
                 metadata["title_usage"] = title_usage
-                metadata_usage = metadata.get("usage", empty_usage_summary())
-                metadata["usage"] = {
-                    "input_tokens": int(metadata_usage.get("input_tokens", 0))
-                    + int(title_usage.get("input_tokens", 0)),
-                    "output_tokens": int(metadata_usage.get("output_tokens", 0))
-                    + int(title_usage.get("output_tokens", 0)),
-                    "total_tokens": int(metadata_usage.get("total_tokens", 0))
-                    + int(title_usage.get("total_tokens", 0)),
-                    "total_cost": round(
-                        float(metadata_usage.get("total_cost", 0.0))
-                        + float(title_usage.get("cost", 0.0) or 0.0),
-                        8,
-                    ),
-                    "model_calls": int(metadata_usage.get("model_calls", 0)) + 1,
-                }
-                stage3_result["title_usage"] = title_usage
-
-            if plan == "pro":
-                usage_summary = metadata.get("usage") or {}
-                tokens_to_consume = max(0, int(usage_summary.get("total_tokens", 0)))
-                model_calls = max(0, int(usage_summary.get("model_calls", 0)))
-                started_any_stage = stage1_started or stage2_started or stage3_started
-
-                # Fallback: when cancellation interrupts usage reporting but model
-                # work already started, charge at least 1 token.
-                if (
-                    cancelled
-                    and tokens_to_consume <= 0
-                    and (model_calls > 0 or started_any_stage)
-                ):
-                    tokens_to_consume = 1
-
-                if tokens_to_consume > 0:
-                    remaining_balance_current = await storage.consume_account_tokens(
-                        user["id"],
-                        tokens_to_consume,
-                        PRO_DAILY_TOKEN_CREDITS,
-                    )
-                else:
-                    remaining_balance_current = await _get_remaining_daily_tokens(user)
-            elif plan == "free":
-                if is_first_message:
-                    # Keep current value: pre-check remaining for no-success Stage 1,
-                    # or consumed balance once Stage 1 produced at least one response.
-                    remaining_balance_current = max(0, int(remaining_balance_current))
-                else:
-                    # Existing conversation continuation stays allowed and does not consume a new free query.
-                    remaining_balance_current = await _get_remaining_daily_queries(
-                        user,
-                        resolved_timezone,
-                    )
-
-            if not user_message_saved:
-                updated_conversation = (
-                    await storage.get_conversation(conversation_id, user["id"]) or {}
+                metadata["usage"] = fold_title_usage(
+                    metadata.get("usage"), title_usage
                 )
-                return metadata, updated_conversation, resolved_title
-
-            await storage.add_assistant_message(
-                conversation_id,
-                user["id"],
-                stage1_results,
-                stage2_results,
-                stage3_result,
-                id_session=conversation_session_id,
-            )
-            updated_conversation = (
-                await storage.get_conversation(conversation_id, user["id"]) or {}
+                if has_call_usage(title_usage):
+                    stage3_result["title_usage"] = title_usage
+
+            try:
+                if plan == "pro":
+                    usage_summary = metadata.get("usage") or {}
+                    tokens_to_consume = max(0, int(usage_summary.get("total_tokens", 0)))
+                    model_calls = max(0, int(usage_summary.get("model_calls", 0)))
+                    started_any_stage = stage1_started or stage2_started or stage3_started
+
+                    # Fallback: when cancellation interrupts usage reporting but model
+                    # work already started, charge at least 1 token.
+                    if (
+                        cancelled
+                        and tokens_to_consume <= 0
+                        and (model_calls > 0 or started_any_stage)
+                    ):
+                        tokens_to_consume = 1
+
+                    if tokens_to_consume > 0:
+                        remaining_balance_current = await storage.consume_account_tokens(
+                            user["id"],
+                            tokens_to_consume,
+                            PRO_DAILY_TOKEN_CREDITS,
+                        )
+                    else:
+                        remaining_balance_current = await _get_remaining_daily_tokens(user)
+                elif plan == "free":
+                    if is_first_message:
+                        # Keep current value: pre-check remaining for no-success Stage 1,
+                        # or consumed balance once Stage 1 produced at least one response.
+                        remaining_balance_current = max(0, int(remaining_balance_current))
+                    else:
+                        # Existing conversation continuation stays allowed and does not consume a new free query.
+                        remaining_balance_current = await _get_remaining_daily_queries(
+                            user,
+                            resolved_timezone,
+                        )
+
+                # The user message is written together with the assistant reply,
+                # so a successful or cancelled turn costs one insert.
+                message_usage = await storage.append_turn(
+                    conversation_id,
+                    user["id"],
+                    message_content,
+                    stage1_results,
+                    stage2_results,
+                    stage3_result,
+                    files=safe_user_files,
+                    id_session=conversation_session_id,
+                )
+                user_message_saved = True
+                if title_update is not None:
+                    await title_update
+            finally:
+                if title_update is not None:
+                    # No-op once awaited above; if quota accounting or the insert
+                    # failed, stop the title write and retrieve its outcome.
+                    title_update.cancel()
+                    with suppress(asyncio.CancelledError, Exception):
+                        await title_update
+
+            conversation_usage = merge_usage_summaries(
+                conversation.get("usage"), message_usage
             )
-            return metadata, updated_conversation, resolved_title
+            return metadata, conversation_usage, resolved_title
 
         try:
-            # Add user message
-            await storage.add_user_message(
-                conversation_id,
-                user["id"],
-                message_content,
-                files=safe_user_files,
-                id_session=conversation_session_id,
-            )
-            user_message_saved = True
-
             # Start title generation in parallel (don't await yet)
             if is_first_message:
                 title_task = asyncio.create_task(
@@ -1423,7 +1607,7 @@ async def send_message_stream(
 
             # Stage 1: Collect responses
             stage1_started = True
-            yield f"data: {json.dumps({'type': 'stage1_start'})}\n\n"
+            yield _SSE_STAGE1_START
             stage1_results = await stage1_collect_responses(
                 resolved_prompt,
                 conversation_history=conversation_history,
@@ -1446,15 +1630,13 @@ async def send_message_stream(
                 except ValueError:
                     _raise_free_daily_query_limit_error(resolved_timezone)
 
-            if await http_request.is_disconnected():
-                await persist_turn(cancelled=True, wait_for_title=False)
-                return
-
-            yield f"data: {json.dumps({'type': 'stage1_complete', 'data': stage1_results})}\n\n"
-
-            # Stage 2: Collect rankings
+            # Stage 2: Collect rankings. The start marker rides in the same
+            # chunk as the Stage 1 results so both reach the client in one send.
             stage2_started = True
-            yield f"data: {json.dumps({'type': 'stage2_start'})}\n\n"
+            yield (
+                _sse_event({"type": "stage1_complete", "data": stage1_results})
+                + _SSE_STAGE2_START
+            )
             stage2_results, label_to_model = await stage2_collect_rankings(
                 resolved_prompt,
                 stage1_results,
@@ -1462,20 +1644,27 @@ async def send_message_stream(
                 session_id=conversation_session_id,
                 council_models=council_models,
                 openrouter_user=openrouter_user,
+                conversation_context_text=conversation_context_text,
             )
             aggregate_rankings = calculate_aggregate_rankings(
                 stage2_results, label_to_model
             )
 
-            if await http_request.is_disconnected():
-                await persist_turn(cancelled=True, wait_for_title=False)
-                return
-
-            yield f"data: {json.dumps({'type': 'stage2_complete', 'data': stage2_results, 'metadata': {'label_to_model': label_to_model, 'aggregate_rankings': aggregate_rankings}})}\n\n"
-
             # Stage 3: Synthesize final answer
             stage3_started = True
-            yield f"data: {json.dumps({'type': 'stage3_start'})}\n\n"
+            yield (
+                _sse_event(
+                    {
+                        "type": "stage2_complete",
+                        "data": stage2_results,
+                        "metadata": {
+                            "label_to_model": label_to_model,
+                            "aggregate_rankings": aggregate_rankings,
+                        },
+                    }
+                )
+                + _SSE_STAGE3_START
+            )
             stage3_result = await stage3_synthesize_final(
                 resolved_prompt,
                 stage1_results,
@@ -1486,16 +1675,13 @@ async def send_message_stream(
                 user_attachments=attachment_parts,
                 plugins=request_plugins,
                 chairman_model=chairman_model,
+                conversation_context_text=conversation_context_text,
             )
 
-            if await http_request.is_disconnected():
-                await persist_turn(cancelled=True, wait_for_title=False)
-                return
-
-            yield f"data: {json.dumps({'type': 'stage3_complete', 'data': stage3_result})}\n\n"
+            yield _sse_event({"type": "stage3_complete", "data": stage3_result})
 
             title_result = await resolve_title_result(wait_for_completion=True)
-            metadata, updated_conversation, resolved_title = await persist_turn(
+            metadata, conversation_usage, resolved_title = await persist_turn(
                 cancelled=False,
                 title_result=title_result,
                 save_title=True,
@@ -1503,10 +1689,17 @@ async def send_message_stream(
 
             if isinstance(resolved_title, dict):
                 title = resolved_title.get("title", "New Conversation")
-                yield f"data: {json.dumps({'type': 'title_complete', 'data': {'title': title}})}\n\n"
+                yield _sse_event({"type": "title_complete", "data": {"title": title}})
 
             # Send completion event
-            yield f"data: {json.dumps({'type': 'complete', 'metadata': metadata, 'credits': remaining_balance_current, 'conversation_usage': (updated_conversation or {}).get('usage', empty_usage_summary())})}\n\n"
+            yield _sse_event(
+                {
+                    "type": "complete",
+                    "metadata": metadata,
+                    "credits": remaining_balance_current,
+                    "conversation_usage": conversation_usage,
+                }
+            )
 
         except asyncio.CancelledError:
             # Client disconnected abruptly. Persist partial work and usage.
@@ -1518,8 +1711,20 @@ async def send_message_stream(
             )
             raise
         except Exception as e:
+            if not user_message_saved:
+                # Keep the user's message even though the turn failed part-way.
+                with suppress(Exception):
+                    await storage.add_user_message(
+                        conversation_id,
+                        user["id"],
+                        message_content,
+                        files=safe_user_files,
+                        id_session=conversation_session_id,
+                    )
             # Send error event
-            yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
+            yield _sse_event({"type": "error", "message": str(e)})
+        finally:
+            _release_message_slot(user["id"], slot_id)
 
     return StreamingResponse(
         event_generator(),
@@ -1528,10 +1733,23 @@ async def send_message_stream(
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
         },
+        # Releasing is idempotent; this covers a body that is never iterated.
+        background=BackgroundTask(_release_message_slot, user["id"], slot_id),
     )
 
 
 if __name__ == "__main__":
+    import os
+
     import uvicorn
 
-    uvicorn.run(app, host="0.0.0.0", port=8001)
+    # Worker processes need the import string; "auto" selects uvloop and
+    # httptools, which uvicorn[standard] installs.
+    uvicorn.run(
+        "backend.main:app",
+        host="0.0.0.0",
+        port=8001,
+        workers=int(os.getenv("WEB_CONCURRENCY") or os.cpu_count() or 1),
+        loop="auto",
+        http="auto",
+    )
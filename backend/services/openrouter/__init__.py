@@ -1,5 +1,15 @@
 """OpenRouter service domain package."""
 
-from .client import query_model, query_models_parallel
+from .client import (
+    close_openrouter_client,
+    get_openrouter_client,
+    query_model,
+    query_models_parallel,
+)
 
-__all__ = ["query_model", "query_models_parallel"]
+__all__ = [
+    "close_openrouter_client",
+    "get_openrouter_client",
+    "query_model",
+    "query_models_parallel",
+]
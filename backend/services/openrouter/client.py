@@ -1,13 +1,67 @@
 """OpenRouter API client for making LLM requests."""
 
 import asyncio
+import random
 import httpx
+import orjson
 from typing import List, Dict, Any, Optional
-from ...config import OPENROUTER_API_KEY, OPENROUTER_API_URL
+from ...config import LLM_CONCURRENCY, OPENROUTER_API_KEY, OPENROUTER_API_URL
 from ...utils import coerce_float as _to_float
 from ...utils import coerce_int as _to_int
 from ...utils import normalize_session_id
 
+# Shared across every council run in this process so bursts queue here instead
+# of oversubscribing outbound connections.
+_request_semaphore = asyncio.Semaphore(LLM_CONCURRENCY)
+
+_RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+_MAX_STATUS_RETRIES = 2
+_RETRY_BASE_DELAY_SECONDS = 0.5
+_RETRY_MAX_DELAY_SECONDS = 8.0
+
+_client: httpx.AsyncClient | None = None
+
+
+def get_openrouter_client() -> httpx.AsyncClient:
+    """Return the shared OpenRouter HTTP client, creating it on first use."""
+    global _client
+    if _client is None or _client.is_closed:
+        # The transport retries failed connection attempts; HTTP-level
+        # retries for throttling and upstream errors live in query_model.
+        _client = httpx.AsyncClient(
+            timeout=120.0,
+            transport=httpx.AsyncHTTPTransport(
+                retries=2,
+                http2=True,
+                limits=httpx.Limits(
+                    max_keepalive_connections=64,
+                    max_connections=128,
+                    keepalive_expiry=60.0,
+                ),
+            ),
+        )
+    return _client
+
+
+async def close_openrouter_client() -> None:
+    """Close the shared OpenRouter HTTP client, if one was opened."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _retry_delay_seconds(response: httpx.Response, attempt: int) -> float:
+    """Honour Retry-After when present, else back off exponentially with jitter."""
+    retry_after = response.headers.get("Retry-After")
+    if retry_after:
+        try:
+            return min(max(float(retry_after), 0.0), _RETRY_MAX_DELAY_SECONDS)
+        except ValueError:
+            pass
+    delay = _RETRY_BASE_DELAY_SECONDS * (2 ** attempt)
+    return min(delay + random.uniform(0, _RETRY_BASE_DELAY_SECONDS), _RETRY_MAX_DELAY_SECONDS)
+
 
 def _normalize_usage(raw_usage: Any) -> Dict[str, Any]:
     """
@@ -41,6 +95,38 @@ def _normalize_usage(raw_usage: Any) -> Dict[str, Any]:
     }
 
 
+# Providers that only reuse prompt prefixes at explicit cache_control markers.
+_EXPLICIT_CACHE_MODEL_PREFIXES = ("anthropic/",)
+
+
+def _with_prompt_cache_breakpoint(
+    model: str,
+    messages: List[Dict[str, Any]],
+) -> List[Dict[str, Any]]:
+    """
+    Mark the conversation prefix as cacheable for explicit-cache providers.
+
+    The breakpoint goes on the message before the newest user turn, so the
+    system prompt and prior turns can be reused on the conversation's next turn.
+    Other providers cache prefixes automatically and get the messages unchanged.
+    """
+    if not model.startswith(_EXPLICIT_CACHE_MODEL_PREFIXES) or len(messages) < 2:
+        return messages
+
+    prefix_end = messages[-2]
+    content = prefix_end.get("content")
+    if not isinstance(content, str) or not content:
+        return messages
+
+    cached_message = {
+        **prefix_end,
+        "content": [
+            {"type": "text", "text": content, "cache_control": {"type": "ephemeral"}}
+        ],
+    }
+    return [*messages[:-2], cached_message, messages[-1]]
+
+
 async def query_model(
     model: str,
     messages: List[Dict[str, Any]],
@@ -68,7 +154,7 @@ async def query_model(
 
     payload = {
         "model": model,
-        "messages": messages,
+        "messages": _with_prompt_cache_breakpoint(model, messages),
     }
     normalized_session_id = normalize_session_id(session_id)
     normalized_openrouter_user = (
@@ -95,23 +181,34 @@ async def query_model(
         payload["plugins"] = plugins
 
     try:
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            response = await client.post(
-                OPENROUTER_API_URL,
-                headers=headers,
-                json=payload
-            )
-            response.raise_for_status()
-
-            data = response.json()
-            message = data['choices'][0]['message']
-            usage = _normalize_usage(data.get("usage"))
-
-            return {
-                'content': message.get('content'),
-                'reasoning_details': message.get('reasoning_details'),
-                'usage': usage,
-            }
+        request_body = orjson.dumps(payload)
+        for attempt in range(_MAX_STATUS_RETRIES + 1):
+            async with _request_semaphore:
+                response = await get_openrouter_client().post(
+                    OPENROUTER_API_URL,
+                    headers=headers,
+                    content=request_body,
+                    timeout=timeout,
+                )
+            if (
+                response.status_code not in _RETRYABLE_STATUS_CODES
+                or attempt == _MAX_STATUS_RETRIES
+            ):
+                break
+            # Back off without holding a concurrency slot.
+            await asyncio.sleep(_retry_delay_seconds(response, attempt))
+
+        response.raise_for_status()
+
+        data = orjson.loads(response.content)
+        message = data['choices'][0]['message']
+        usage = _normalize_usage(data.get("usage"))
+
+        return {
+            'content': message.get('content'),
+            'reasoning_details': message.get('reasoning_details'),
+            'usage': usage,
+        }
 
     except Exception as e:
         print(f"Error querying model {model}: {e}")
@@ -7,7 +7,7 @@ from .billing import (
     reconcile_checkout_session_to_plan,
     verify_stripe_signature,
 )
-from .client import stripe_request
+from .client import close_stripe_client, get_stripe_client, stripe_request
 
 __all__ = [
     "confirm_checkout_session",
@@ -16,4 +16,6 @@ __all__ = [
     "reconcile_checkout_session_to_plan",
     "verify_stripe_signature",
     "stripe_request",
+    "get_stripe_client",
+    "close_stripe_client",
 ]
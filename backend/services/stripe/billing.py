@@ -1,29 +1,67 @@
 """Stripe billing workflows for checkout and webhook reconciliation."""
 
-from datetime import datetime, timezone
+import asyncio
 import hashlib
 import hmac
-import json
+import re
 import time
 from typing import Any, Dict
-from urllib.parse import urlparse
 
+import orjson
+from cachetools import TTLCache
 from fastapi import HTTPException
+from pydantic import BaseModel, ConfigDict, ValidationError
 
 from ...config import COUNCIL_ENV, STRIPE_WEBHOOK_SECRET
+from ...utils import now_utc
 from ...utils import unix_to_iso_datetime as _iso_datetime_from_unix
 from ..supabase import storage
 from ..supabase.auth import update_user_plan_metadata
 from .client import stripe_request
 
+_WEBHOOK_SECRET_BYTES = (STRIPE_WEBHOOK_SECRET or "").encode("utf-8")
+# Payloads above this size are verified in a worker thread.
+_THREADED_SIGNATURE_MIN_BYTES = 64 * 1024
+_SIGNATURE_PART_RE = re.compile(r"(?:^|,)\s*(t|v1)=([^,\s]+)")
+# Form fields shared by every Pro checkout session; per-request values are layered on top.
+_PRO_CHECKOUT_BASE: Dict[str, str] = {
+    "mode": "subscription",
+    "payment_method_types[0]": "card",
+    "line_items[0][quantity]": "1",
+    "line_items[0][price_data][currency]": "brl",
+    "line_items[0][price_data][recurring][interval]": "month",
+    "line_items[0][price_data][product_data][name]": "LLM Council Pro",
+    "line_items[0][price_data][product_data][description]": "Pro monthly plan",
+    "metadata[plan]": "pro",
+}
+# Event ids this process already handled; Stripe redelivers events for days.
+_processed_event_ids: TTLCache = TTLCache(maxsize=4096, ttl=24 * 60 * 60)
+
+
+class StripeCheckoutSession(BaseModel):
+    """Checkout Session fields used for plan reconciliation."""
+
+    model_config = ConfigDict(extra="ignore")
+
+    mode: str | None = None
+    status: str | None = None
+    payment_status: str | None = None
+    customer: str | Dict[str, Any] | None = None
+    subscription: str | Dict[str, Any] | None = None
+
 
 def _is_valid_absolute_url(value: str) -> bool:
     """Allow only absolute http(s) URLs."""
-    try:
-        parsed = urlparse(value)
-    except Exception:
+    if not isinstance(value, str) or len(value) >= 2048:
+        return False
+    if value.startswith("https://"):
+        host_start = 8
+    elif value.startswith("http://"):
+        host_start = 7
+    else:
         return False
-    return parsed.scheme in {"http", "https"} and bool(parsed.netloc)
+    # Require a non-empty host before any path, query or fragment.
+    return host_start < len(value) and value[host_start] not in "/?#"
 
 
 def extract_checkout_user_id(checkout_session: Dict[str, Any]) -> str | None:
@@ -43,13 +81,7 @@ def verify_stripe_signature(payload: bytes, signature_header: str) -> bool:
     if not STRIPE_WEBHOOK_SECRET:
         return COUNCIL_ENV in {"development", "dev", "local"}
 
-    parts = {}
-    for item in signature_header.split(","):
-        if "=" not in item:
-            continue
-        key, value = item.split("=", 1)
-        parts[key.strip()] = value.strip()
-
+    parts = dict(_SIGNATURE_PART_RE.findall(signature_header))
     timestamp_text = parts.get("t")
     signature_v1 = parts.get("v1")
     if not timestamp_text or not signature_v1:
@@ -64,12 +96,14 @@ def verify_stripe_signature(payload: bytes, signature_header: str) -> bool:
     if abs(int(time.time()) - timestamp) > 300:
         return False
 
-    signed_payload = f"{timestamp}.{payload.decode('utf-8')}"
-    expected = hmac.new(
-        STRIPE_WEBHOOK_SECRET.encode("utf-8"),
-        signed_payload.encode("utf-8"),
+    # Feed the payload incrementally instead of concatenating it onto the prefix.
+    signer = hmac.new(
+        _WEBHOOK_SECRET_BYTES,
+        f"{timestamp}.".encode("ascii"),
         hashlib.sha256,
-    ).hexdigest()
+    )
+    signer.update(payload)
+    expected = signer.hexdigest()
     return hmac.compare_digest(expected, signature_v1)
 
 
@@ -87,23 +121,31 @@ async def reconcile_checkout_session_to_plan(
             detail="Checkout session is missing user mapping.",
         )
 
-    if checkout_session.get("mode") != "subscription":
+    try:
+        session = StripeCheckoutSession.model_validate(checkout_session)
+    except ValidationError as error:
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid checkout session payload.",
+        ) from error
+
+    if session.mode != "subscription":
         raise HTTPException(
             status_code=400,
             detail="Checkout session is not a subscription.",
         )
 
-    status = checkout_session.get("status")
-    if status != "complete":
+    if session.status != "complete":
         raise HTTPException(
             status_code=400,
             detail="Checkout session is not complete.",
         )
 
-    payment_status = checkout_session.get("payment_status")
+    payment_status = session.payment_status
     should_activate_pro = payment_status in {"paid", "no_payment_required"}
+    paid_at = now_utc().isoformat() if should_activate_pro else None
 
-    subscription_field = checkout_session.get("subscription")
+    subscription_field = session.subscription
     stripe_subscription_id = (
         subscription_field.get("id")
         if isinstance(subscription_field, dict)
@@ -112,8 +154,7 @@ async def reconcile_checkout_session_to_plan(
     if not isinstance(stripe_subscription_id, str):
         stripe_subscription_id = None
 
-    customer_field = checkout_session.get("customer")
-    stripe_customer_id = customer_field if isinstance(customer_field, str) else None
+    stripe_customer_id = session.customer if isinstance(session.customer, str) else None
 
     next_payment_at = None
     if isinstance(subscription_field, dict):
@@ -145,9 +186,7 @@ async def reconcile_checkout_session_to_plan(
         checkout_session,
         event_type=event_type,
         stripe_event_id=stripe_event_id,
-        paid_at=(
-            datetime.now(timezone.utc).isoformat() if should_activate_pro else None
-        ),
+        paid_at=paid_at,
         next_payment_at=next_payment_at,
     )
 
@@ -176,19 +215,12 @@ async def create_pro_checkout_session(
         )
 
     payload = {
-        "mode": "subscription",
+        **_PRO_CHECKOUT_BASE,
         "success_url": success_url,
         "cancel_url": cancel_url,
-        "payment_method_types[0]": "card",
-        "line_items[0][quantity]": "1",
-        "line_items[0][price_data][currency]": "brl",
         "line_items[0][price_data][unit_amount]": str(pro_price_brl_cents),
-        "line_items[0][price_data][recurring][interval]": "month",
-        "line_items[0][price_data][product_data][name]": "LLM Council Pro",
-        "line_items[0][price_data][product_data][description]": "Pro monthly plan",
         "client_reference_id": user_id,
         "metadata[user_id]": user_id,
-        "metadata[plan]": "pro",
     }
     if isinstance(user_email, str) and user_email:
         payload["customer_email"] = user_email
@@ -258,34 +290,47 @@ async def process_stripe_webhook(
     if STRIPE_WEBHOOK_SECRET and not stripe_signature:
         raise HTTPException(status_code=400, detail="Missing Stripe-Signature header.")
 
-    if not verify_stripe_signature(payload, stripe_signature or ""):
+    if len(payload) > _THREADED_SIGNATURE_MIN_BYTES:
+        signature_valid = await asyncio.to_thread(
+            verify_stripe_signature, payload, stripe_signature or ""
+        )
+    else:
+        signature_valid = verify_stripe_signature(payload, stripe_signature or "")
+    if not signature_valid:
         raise HTTPException(status_code=400, detail="Invalid Stripe signature.")
 
     try:
-        event = json.loads(payload.decode("utf-8"))
-    except ValueError as error:
+        event = orjson.loads(payload)
+    except orjson.JSONDecodeError as error:
         raise HTTPException(status_code=400, detail="Invalid webhook payload.") from error
 
     if not isinstance(event, dict):
         raise HTTPException(status_code=400, detail="Invalid webhook payload shape.")
 
+    event_id = event.get("id")
+    if not isinstance(event_id, str) or not event_id:
+        event_id = None
+    if event_id is not None and event_id in _processed_event_ids:
+        return {"received": True, "duplicate": True}
+
     event_type = event.get("type")
     data_object = (event.get("data") or {}).get("object")
     if not isinstance(data_object, dict):
         return {"received": True, "ignored": True}
 
+    result: Dict[str, Any] = {"received": True}
     if event_type == "checkout.session.completed":
-        stripe_event_id = event.get("id")
-        if not isinstance(stripe_event_id, str):
-            stripe_event_id = None
         try:
             await reconcile_checkout_session_to_plan(
                 data_object,
                 event_type=event_type,
-                stripe_event_id=stripe_event_id,
+                stripe_event_id=event_id,
             )
         except HTTPException:
             # Acknowledge webhook to avoid retries on irrecoverable payload mismatch.
-            return {"received": True, "processed": False}
+            result = {"received": True, "processed": False}
 
-    return {"received": True}
+    # Only remember events that were handled, so failures stay retryable.
+    if event_id is not None:
+        _processed_event_ids[event_id] = True
+    return result
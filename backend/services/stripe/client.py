@@ -3,10 +3,41 @@
 from typing import Any, Dict
 
 import httpx
+import orjson
 from fastapi import HTTPException
 
 from ...config import STRIPE_SECRET_KEY
 
+STRIPE_API_BASE_URL = "https://api.stripe.com"
+
+_client: httpx.AsyncClient | None = None
+
+
+def get_stripe_client() -> httpx.AsyncClient:
+    """Return the shared Stripe HTTP client, creating it on first use."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            base_url=STRIPE_API_BASE_URL,
+            timeout=30,
+            headers={"Authorization": f"Bearer {STRIPE_SECRET_KEY}"},
+            limits=httpx.Limits(
+                max_keepalive_connections=32,
+                max_connections=64,
+                keepalive_expiry=60.0,
+            ),
+            http2=True,
+        )
+    return _client
+
+
+async def close_stripe_client() -> None:
+    """Close the shared Stripe HTTP client, if one was opened."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
 
 def _extract_stripe_error_message(payload: Any, fallback: str) -> str:
     """Extract a readable error message from Stripe JSON payloads."""
@@ -33,27 +64,24 @@ async def stripe_request(
             detail="Stripe is not configured on server.",
         )
 
-    url = f"https://api.stripe.com{path}"
-    async with httpx.AsyncClient(timeout=30) as client:
-        response = await client.request(
-            method=method,
-            url=url,
-            data=data,
-            params=params,
-            headers={"Authorization": f"Bearer {STRIPE_SECRET_KEY}"},
-        )
+    response = await get_stripe_client().request(
+        method=method,
+        url=path,
+        data=data,
+        params=params,
+    )
 
     if response.status_code >= 400:
         message = "Stripe request failed."
         try:
-            payload = response.json()
+            payload = orjson.loads(response.content)
             message = _extract_stripe_error_message(payload, message)
         except ValueError:
             pass
         raise HTTPException(status_code=502, detail=message)
 
     try:
-        payload = response.json()
+        payload = orjson.loads(response.content)
     except ValueError as error:
         raise HTTPException(
             status_code=502,
@@ -1,11 +1,16 @@
 """Supabase authentication helpers."""
 
+import base64
+import hashlib
+import time
 from typing import Any, Dict, List
 
 import httpx
+import orjson
+from cachetools import TLRUCache
 from fastapi import HTTPException
 
-from ...utils import normalize_plan
+from ...utils import coerce_float, normalize_plan
 from .rest import (
     build_service_role_headers,
     ensure_supabase_auth_config,
@@ -16,6 +21,35 @@ from .rest import (
 ROLE_USER = "user"
 ROLE_ADMIN = "admin"
 VALID_USER_ROLES = {ROLE_USER, ROLE_ADMIN}
+TOKEN_USER_CACHE_TTL_SECONDS = 60
+
+
+def _token_expires_at(access_token: str) -> float | None:
+    """Return the JWT ``exp`` claim in epoch seconds, or None when unreadable."""
+    # Only read after Supabase has accepted the token, so no signature check.
+    try:
+        segment = access_token.split(".")[1]
+        claims = orjson.loads(base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4)))
+    except (IndexError, ValueError):
+        return None
+    return coerce_float(claims.get("exp")) if isinstance(claims, dict) else None
+
+
+def _token_cache_ttu(_key: str, value: tuple, now: float) -> float:
+    """Expire cached users after the cache TTL or at token expiry, if sooner."""
+    ttl = float(TOKEN_USER_CACHE_TTL_SECONDS)
+    expires_at = value[1]
+    if expires_at is not None:
+        ttl = min(ttl, expires_at - time.time())
+    return now + ttl
+
+
+# Validated users keyed by a digest of their access token, so repeat requests
+# with the same session skip the Supabase /auth/v1/user round-trip. Values are
+# (user, token exp) pairs. The cache is per process: invalidate_cached_user
+# only reaches the current worker, so other workers may serve stale metadata
+# for at most TOKEN_USER_CACHE_TTL_SECONDS.
+_token_user_cache: TLRUCache = TLRUCache(maxsize=4096, ttu=_token_cache_ttu)
 
 
 def _ensure_supabase_config() -> tuple[str, str]:
@@ -33,6 +67,21 @@ def _admin_headers(api_key: str) -> Dict[str, str]:
     return build_service_role_headers(api_key, include_content_type=True)
 
 
+def _token_cache_key(access_token: str) -> str:
+    """Return a compact, non-reversible cache key for an access token."""
+    return hashlib.blake2b(access_token.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def invalidate_cached_user(user_id: str) -> None:
+    """Drop cached token lookups for a user whose metadata changed."""
+    stale_keys = [
+        key for key, (cached_user, _) in list(_token_user_cache.items())
+        if cached_user.get("id") == user_id
+    ]
+    for key in stale_keys:
+        _token_user_cache.pop(key, None)
+
+
 def normalize_user_role(value: Any) -> str:
     """Normalize role text to the accepted role set."""
     if not isinstance(value, str):
@@ -88,6 +137,11 @@ async def login_user(email: str, password: str) -> Dict[str, Any]:
 
 async def get_user_from_token(access_token: str) -> Dict[str, Any]:
     """Validate access token and return user profile from Supabase."""
+    cache_key = _token_cache_key(access_token)
+    cached = _token_user_cache.get(cache_key)
+    if cached is not None:
+        return cached[0]
+
     supabase_url, api_key = _ensure_supabase_config()
     url = f"{supabase_url}/auth/v1/user"
 
@@ -104,6 +158,9 @@ async def get_user_from_token(access_token: str) -> Dict[str, Any]:
     if response.status_code >= 400:
         raise HTTPException(status_code=401, detail="Invalid or expired session.")
 
+    if isinstance(data, dict):
+        # Entries whose token has already expired are not stored.
+        _token_user_cache[cache_key] = (data, _token_expires_at(access_token))
     return data
 
 
@@ -150,6 +207,8 @@ async def _update_user_app_metadata(
             detail=_extract_error_message(data, "Failed to update user metadata."),
         )
 
+    invalidate_cached_user(user_id)
+
     if isinstance(data, dict) and isinstance(data.get("user"), dict):
         return data["user"]
     if isinstance(data, dict):
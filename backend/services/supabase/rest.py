@@ -1,16 +1,31 @@
 """Shared Supabase config, headers, and HTTP helpers."""
 
-from typing import Any, Dict, Optional
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 import httpx
+import orjson
 from fastapi import HTTPException
 
 from ...config import SUPABASE_SECRET_KEY, SUPABASE_URL
 
+# Config is fixed at import, so normalize the base URL once instead of per call.
+_SUPABASE_BASE_URL = SUPABASE_URL.rstrip("/") if SUPABASE_URL else ""
+_SUPABASE_CONFIG = (_SUPABASE_BASE_URL, SUPABASE_SECRET_KEY)
+
+QueryParams = Dict[str, str] | Sequence[Tuple[str, str]]
+
+PREFER_MINIMAL = "return=minimal"
+PREFER_REPRESENTATION = "return=representation"
+PREFER_IGNORE_DUPLICATES = "resolution=ignore-duplicates,return=minimal"
+PREFER_MERGE_DUPLICATES = "resolution=merge-duplicates,return=representation"
+
+_rest_client: httpx.AsyncClient | None = None
+
 
 def ensure_supabase_auth_config() -> tuple[str, str]:
     """Return validated Supabase config values for auth/admin flows."""
-    if not SUPABASE_URL:
+    if not _SUPABASE_BASE_URL:
         raise HTTPException(
             status_code=500,
             detail=(
@@ -28,12 +43,12 @@ def ensure_supabase_auth_config() -> tuple[str, str]:
             ),
         )
 
-    return SUPABASE_URL.rstrip("/"), SUPABASE_SECRET_KEY
+    return _SUPABASE_CONFIG
 
 
 def ensure_supabase_db_config() -> tuple[str, str]:
     """Return validated Supabase config values for PostgREST data access."""
-    if not SUPABASE_URL:
+    if not _SUPABASE_BASE_URL:
         raise RuntimeError(
             "Supabase DB is not configured. Missing SUPABASE_URL (or SUPABASE_PROJECT_URL)."
         )
@@ -42,7 +57,7 @@ def ensure_supabase_db_config() -> tuple[str, str]:
             "Supabase DB is not configured. Missing SUPABASE_API_KEY_SECRET "
             "(or SUPABASE_SERVICE_ROLE_KEY)."
         )
-    return SUPABASE_URL.rstrip("/"), SUPABASE_SECRET_KEY
+    return _SUPABASE_CONFIG
 
 
 def build_service_role_headers(
@@ -84,37 +99,68 @@ def extract_db_error_message(payload: Any, fallback: str) -> str:
     return fallback
 
 
+def get_supabase_rest_client() -> httpx.AsyncClient:
+    """Return the shared PostgREST HTTP client, creating it on first use."""
+    global _rest_client
+    if _rest_client is None or _rest_client.is_closed:
+        supabase_url, api_key = ensure_supabase_db_config()
+        _rest_client = httpx.AsyncClient(
+            base_url=f"{supabase_url}/rest/v1/",
+            timeout=httpx.Timeout(20.0, connect=10.0),
+            headers=build_service_role_headers(api_key),
+            limits=httpx.Limits(
+                max_keepalive_connections=40,
+                max_connections=100,
+                keepalive_expiry=30.0,
+            ),
+            http2=True,
+        )
+    return _rest_client
+
+
+async def close_supabase_rest_client() -> None:
+    """Close the shared PostgREST HTTP client, if one was opened."""
+    global _rest_client
+    if _rest_client is not None:
+        await _rest_client.aclose()
+        _rest_client = None
+
+
+@lru_cache(maxsize=16)
+def _request_headers(has_body: bool, prefer: Optional[str]) -> Optional[Dict[str, str]]:
+    """Return the per-request headers layered over the client's auth headers."""
+    headers: Dict[str, str] = {}
+    if has_body:
+        headers["Content-Type"] = "application/json"
+    if prefer:
+        headers["Prefer"] = prefer
+    return headers or None
+
+
 async def rest_request(
     method: str,
     resource: str,
     *,
-    params: Optional[Dict[str, str]] = None,
-    json_body: Optional[Dict[str, Any]] = None,
+    params: Optional[QueryParams] = None,
+    json_body: Optional[Dict[str, Any] | List[Dict[str, Any]]] = None,
     prefer: Optional[str] = None,
 ):
     """Make an authenticated request to Supabase PostgREST."""
-    supabase_url, api_key = ensure_supabase_db_config()
-    url = f"{supabase_url}/rest/v1/{resource}"
+    client = get_supabase_rest_client()
 
-    headers = build_service_role_headers(
-        api_key,
-        include_content_type=json_body is not None,
-    )
-    if prefer:
-        headers["Prefer"] = prefer
+    content = orjson.dumps(json_body) if json_body is not None else None
 
-    async with httpx.AsyncClient(timeout=20) as client:
-        response = await client.request(
-            method=method,
-            url=url,
-            params=params,
-            json=json_body,
-            headers=headers,
-        )
+    response = await client.request(
+        method=method,
+        url=resource,
+        params=params,
+        content=content,
+        headers=_request_headers(content is not None, prefer),
+    )
 
     if response.status_code >= 400:
         try:
-            payload = response.json()
+            payload = orjson.loads(response.content)
         except ValueError:
             payload = None
         raise RuntimeError(
@@ -127,6 +173,6 @@ async def rest_request(
         return None
 
     try:
-        return response.json()
+        return orjson.loads(response.content)
     except ValueError:
         return None
@@ -1,22 +1,80 @@
 """Supabase Postgres storage for conversations."""
 
 from typing import Any, Dict, List, Optional
-from datetime import datetime, timezone
+from datetime import timezone, tzinfo
+from functools import lru_cache
 from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
-import json
 
+import orjson
+
+from ...stages import calculate_aggregate_rankings
+from ...stages.stage2 import RESPONSE_LABELS as _RESPONSE_LABELS
 from ...utils import coerce_float as _to_float
 from ...utils import coerce_int as _to_int
 from ...utils import normalize_plan
 from ...utils import normalize_session_id as _normalize_session_id
 from ...utils import now_utc as _now_utc
-from ...utils import parse_iso_datetime as _parse_iso_datetime
+from .rest import PREFER_MERGE_DUPLICATES
+from .rest import PREFER_REPRESENTATION
+from .rest import QueryParams
 from .rest import ensure_supabase_db_config
 from .rest import extract_db_error_message
 from .rest import rest_request
 
 
 USER_MESSAGE_PAYLOAD_PREFIX = "__llm_council_user_message_v1__:"
+_USER_MESSAGE_PAYLOAD_PREFIX_LEN = len(USER_MESSAGE_PAYLOAD_PREFIX)
+_DEFAULT_FILE_KIND = "file"
+_DEFAULT_FILE_MIME_TYPE = "application/octet-stream"
+DEFAULT_CONVERSATION_TITLE = "New Conversation"
+
+# Static PostgREST query parts; per-call filters are appended as tuples.
+_CREDIT_UPSERT_PARAMS = (("on_conflict", "user_id"),)
+_BILLING_UPSERT_PARAMS = (("on_conflict", "stripe_checkout_session_id"),)
+_BILLING_PAYMENT_LIST_PARAMS = (
+    (
+        "select",
+        "stripe_checkout_session_id,plan,amount_total,currency,checkout_status,"
+        "payment_status,stripe_customer_id,stripe_subscription_id,"
+        "stripe_payment_intent_id,stripe_invoice_id,last_event_type,"
+        "stripe_event_id,paid_at,next_payment_at,processed_at,created_at",
+    ),
+    ("order", "processed_at.desc"),
+)
+# Checkout session fields kept in billing_payments.payload for auditing; the
+# rest of the Stripe object is not read back and only bloats the JSONB row.
+_BILLING_PAYLOAD_KEYS = (
+    "id",
+    "mode",
+    "client_reference_id",
+    "customer",
+    "payment_intent",
+    "invoice",
+    "subscription",
+    "amount_total",
+    "currency",
+    "status",
+    "payment_status",
+    "metadata",
+)
+_FEEDBACK_LIST_PARAMS = (
+    ("select", "user_email,message,created_at"),
+    ("order", "created_at.desc,id.desc"),
+)
+
+
+@lru_cache(maxsize=256)
+def _load_reset_timezone(name: str) -> tzinfo:
+    """Load a timezone by IANA name, caching UTC for unknown names too."""
+    try:
+        return ZoneInfo(name)
+    except ZoneInfoNotFoundError:
+        return timezone.utc
+
+
+def _timezone_key(tz: tzinfo) -> str:
+    """Return the IANA name Postgres should use for a resolved reset timezone."""
+    return getattr(tz, "key", "UTC")
 
 
 def _resolve_daily_reset_timezone(timezone_name: str | None):
@@ -26,10 +84,7 @@ def _resolve_daily_reset_timezone(timezone_name: str | None):
     normalized = timezone_name.strip()
     if not normalized:
         return timezone.utc
-    try:
-        return ZoneInfo(normalized)
-    except ZoneInfoNotFoundError:
-        return timezone.utc
+    return _load_reset_timezone(normalized)
 
 
 def _normalize_user_files_payload(value: Any) -> List[Dict[str, Any]]:
@@ -43,19 +98,21 @@ def _normalize_user_files_payload(value: Any) -> List[Dict[str, Any]]:
             continue
 
         name = item.get("name")
-        if not isinstance(name, str) or not name.strip():
+        if not isinstance(name, str) or not (name := name.strip()):
             continue
 
+        kind = item.get("kind") or _DEFAULT_FILE_KIND
+        mime_type = item.get("mime_type") or _DEFAULT_FILE_MIME_TYPE
         file_payload = {
-            "name": name.strip()[:255],
-            "kind": str(item.get("kind") or "file")[:32],
-            "mime_type": str(item.get("mime_type") or "application/octet-stream")[:127],
+            "name": name[:255],
+            "kind": (kind if type(kind) is str else str(kind))[:32],
+            "mime_type": (mime_type if type(mime_type) is str else str(mime_type))[:127],
             "size_bytes": max(0, _to_int(item.get("size_bytes"))),
         }
 
         processed_name = item.get("processed_name")
-        if isinstance(processed_name, str) and processed_name.strip():
-            file_payload["processed_name"] = processed_name.strip()[:255]
+        if isinstance(processed_name, str) and (processed_name := processed_name.strip()):
+            file_payload["processed_name"] = processed_name[:255]
 
         converted_to_pdf = item.get("converted_to_pdf")
         if isinstance(converted_to_pdf, bool):
@@ -77,7 +134,7 @@ def _encode_user_message_content(content: str, files: List[Dict[str, Any]] | Non
         "text": text,
         "files": normalized_files,
     }
-    return f"{USER_MESSAGE_PAYLOAD_PREFIX}{json.dumps(payload, separators=(',', ':'))}"
+    return USER_MESSAGE_PAYLOAD_PREFIX + orjson.dumps(payload).decode()
 
 
 def _decode_user_message_content(raw_content: Any) -> tuple[str, List[Dict[str, Any]]]:
@@ -88,10 +145,10 @@ def _decode_user_message_content(raw_content: Any) -> tuple[str, List[Dict[str,
     if not raw_content.startswith(USER_MESSAGE_PAYLOAD_PREFIX):
         return raw_content, []
 
-    encoded_payload = raw_content[len(USER_MESSAGE_PAYLOAD_PREFIX):]
+    encoded_payload = raw_content[_USER_MESSAGE_PAYLOAD_PREFIX_LEN:]
     try:
-        payload = json.loads(encoded_payload)
-    except json.JSONDecodeError:
+        payload = orjson.loads(encoded_payload)
+    except orjson.JSONDecodeError:
         return raw_content, []
 
     if not isinstance(payload, dict):
@@ -129,24 +186,6 @@ def _add_usage_summary(total: Dict[str, Any], summary: Any):
         total["total_cost"] += total_cost
 
 
-def _add_single_call_usage(total: Dict[str, Any], usage: Any):
-    """Accumulate usage from one model invocation."""
-    if not isinstance(usage, dict):
-        return
-
-    total["input_tokens"] += _to_int(usage.get("input_tokens"))
-    total["output_tokens"] += _to_int(usage.get("output_tokens"))
-    total["total_tokens"] += _to_int(usage.get("total_tokens"))
-
-    cost = _to_float(usage.get("cost"))
-    if cost is None:
-        cost = _to_float(usage.get("total_cost"))
-    if cost is not None:
-        total["total_cost"] += cost
-
-    total["model_calls"] += 1
-
-
 def _calculate_message_usage(
     stage1: Any,
     stage2: Any,
@@ -155,34 +194,53 @@ def _calculate_message_usage(
     persisted_cost: Any = None,
 ) -> Dict[str, Any]:
     """Aggregate usage for a single assistant message payload."""
-    usage = _empty_usage_summary()
-
-    if isinstance(stage1, list):
-        for item in stage1:
-            if isinstance(item, dict):
-                _add_single_call_usage(usage, item.get("usage"))
+    # Stage payloads come straight from JSON decoding, so exact type checks
+    # are enough and cheaper than isinstance on this per-message path.
+    call_usages: List[Any] = []
+    if type(stage1) is list:
+        call_usages.extend(item.get("usage") for item in stage1 if type(item) is dict)
+    if type(stage2) is list:
+        call_usages.extend(item.get("usage") for item in stage2 if type(item) is dict)
+    if type(stage3) is dict:
+        call_usages.append(stage3.get("usage"))
+        call_usages.append(stage3.get("title_usage"))
+
+    input_tokens = output_tokens = total_tokens = model_calls = 0
+    total_cost = 0.0
+    for usage in call_usages:
+        if type(usage) is not dict:
+            continue
+        input_tokens += _to_int(usage.get("input_tokens"))
+        output_tokens += _to_int(usage.get("output_tokens"))
+        total_tokens += _to_int(usage.get("total_tokens"))
 
-    if isinstance(stage2, list):
-        for item in stage2:
-            if isinstance(item, dict):
-                _add_single_call_usage(usage, item.get("usage"))
+        cost = usage.get("cost")
+        if type(cost) is not float:
+            cost = _to_float(cost)
+            if cost is None:
+                cost = _to_float(usage.get("total_cost"))
+        if cost is not None:
+            total_cost += cost
 
-    if isinstance(stage3, dict):
-        _add_single_call_usage(usage, stage3.get("usage"))
-        _add_single_call_usage(usage, stage3.get("title_usage"))
+        model_calls += 1
 
     # Prefer persisted column totals when available, but keep stage-derived
     # values as fallback for older rows that may not have been backfilled.
     total_tokens_from_column = _to_int(persisted_total_tokens)
     if total_tokens_from_column > 0:
-        usage["total_tokens"] = total_tokens_from_column
+        total_tokens = total_tokens_from_column
 
     cost_from_column = _to_float(persisted_cost)
     if cost_from_column is not None and cost_from_column > 0:
-        usage["total_cost"] = cost_from_column
+        total_cost = cost_from_column
 
-    usage["total_cost"] = round(usage["total_cost"], 8)
-    return usage
+    return {
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "total_tokens": total_tokens,
+        "total_cost": round(total_cost, 8),
+        "model_calls": model_calls,
+    }
 
 
 def _build_stage_metadata(stage1: Any, stage2: Any, usage: Dict[str, Any]) -> Dict[str, Any]:
@@ -192,13 +250,13 @@ def _build_stage_metadata(stage1: Any, stage2: Any, usage: Dict[str, Any]) -> Di
         return metadata
 
     label_to_model: Dict[str, str] = {}
-    for index, result in enumerate(stage1):
+    for label, result in zip(_RESPONSE_LABELS, stage1):
         if not isinstance(result, dict):
             continue
         model = result.get("model")
         if not isinstance(model, str):
             continue
-        label_to_model[f"Response {chr(65 + index)}"] = model
+        label_to_model[label] = model
 
     if not label_to_model:
         return metadata
@@ -212,8 +270,6 @@ def _build_stage_metadata(stage1: Any, stage2: Any, usage: Dict[str, Any]) -> Di
             continue
         normalized_stage2.append(item)
 
-    from ...council import calculate_aggregate_rankings
-
     metadata["label_to_model"] = label_to_model
     metadata["aggregate_rankings"] = calculate_aggregate_rankings(
         normalized_stage2, label_to_model
@@ -235,8 +291,8 @@ async def _rest_request(
     method: str,
     resource: str,
     *,
-    params: Optional[Dict[str, str]] = None,
-    json_body: Optional[Dict[str, Any]] = None,
+    params: Optional[QueryParams] = None,
+    json_body: Optional[Dict[str, Any] | List[Dict[str, Any]]] = None,
     prefer: Optional[str] = None,
 ):
     """Compatibility wrapper around shared PostgREST request helper."""
@@ -249,23 +305,47 @@ async def _rest_request(
     )
 
 
-async def _get_conversation_row(
-    conversation_id: str, user_id: str
-) -> Optional[Dict[str, Any]]:
-    """Load a single conversation row owned by the provided user."""
+async def _append_owned_messages(
+    conversation_id: str,
+    user_id: str,
+    rows: List[Dict[str, Any]],
+):
+    """Insert message rows in order, only into a conversation owned by user_id."""
+    try:
+        await _rest_request(
+            "POST",
+            "rpc/append_conversation_messages",
+            json_body={
+                "p_user_id": user_id,
+                "p_conversation_id": conversation_id,
+                "p_messages": rows,
+            },
+        )
+    except RuntimeError as exc:
+        if str(exc) == "CONVERSATION_NOT_FOUND":
+            raise ValueError(f"Conversation {conversation_id} not found") from exc
+        raise
+
+
+async def _patch_owned_conversation(
+    conversation_id: str,
+    user_id: str,
+    values: Dict[str, Any],
+):
+    """Update a conversation owned by user_id, failing if no row matched."""
     rows = await _rest_request(
-        "GET",
+        "PATCH",
         "conversations",
-        params={
-            "select": "id,created_at,title,user_id,archived",
-            "id": f"eq.{conversation_id}",
-            "user_id": f"eq.{user_id}",
-            "limit": "1",
-        },
+        params=(
+            ("select", "id"),
+            ("id", f"eq.{conversation_id}"),
+            ("user_id", f"eq.{user_id}"),
+        ),
+        json_body=values,
+        prefer=PREFER_REPRESENTATION,
     )
     if not rows:
-        return None
-    return rows[0]
+        raise ValueError(f"Conversation {conversation_id} not found")
 
 
 async def create_conversation(conversation_id: str, user_id: str) -> Dict[str, Any]:
@@ -276,41 +356,54 @@ async def create_conversation(conversation_id: str, user_id: str) -> Dict[str, A
         json_body={
             "id": conversation_id,
             "user_id": user_id,
-            "title": "New Conversation",
+            "title": DEFAULT_CONVERSATION_TITLE,
             "archived": False,
         },
-        prefer="return=representation",
+        prefer=PREFER_REPRESENTATION,
     )
     row = rows[0]
     return {
         "id": row["id"],
         "created_at": row["created_at"],
-        "title": row.get("title") or "New Conversation",
-        "archived": bool(row.get("archived", False)),
+        "title": row["title"] or DEFAULT_CONVERSATION_TITLE,
+        "archived": row["archived"],
         "messages": [],
         "usage": _empty_usage_summary(),
     }
 
 
-async def get_conversation(conversation_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+async def get_conversation(
+    conversation_id: str,
+    user_id: str,
+    *,
+    limit: Optional[int] = None,
+    before_id: Optional[int] = None,
+) -> Optional[Dict[str, Any]]:
     """Load conversation and its messages only if owned by user_id."""
-    conversation_row = await _get_conversation_row(conversation_id, user_id)
-    if conversation_row is None:
-        return None
-
-    message_rows = await _rest_request(
-        "GET",
-        "messages",
-        params={
-            "select": "id,role,id_session,content,stage1,stage2,stage3,cost,total_tokens,created_at",
-            "conversation_id": f"eq.{conversation_id}",
-            "order": "created_at.asc,id.asc",
-        },
+    # One RPC checks ownership and returns the conversation with its ordered
+    # messages; it yields null when the conversation is not owned.
+    json_body: Dict[str, Any] = {"p_conversation_id": conversation_id, "p_user_id": user_id}
+    if limit is not None:
+        # Ask for one extra row so a further page can be detected.
+        json_body["p_limit"] = limit + 1
+    if before_id is not None:
+        json_body["p_before_id"] = before_id
+    payload = await _rest_request(
+        "POST",
+        "rpc/get_conversation_with_messages",
+        json_body=json_body,
     )
+    if not payload:
+        return None
+    conversation_row = payload["conversation"]
+    message_rows = payload["messages"]
+    has_more = limit is not None and len(message_rows) > limit
+    if has_more:
+        message_rows = message_rows[1:]
 
     messages: List[Dict[str, Any]] = []
     conversation_usage = _empty_usage_summary()
-    for row in message_rows or []:
+    for row in message_rows:
         if row["role"] == "user":
             content_text, files = _decode_user_message_content(row.get("content", ""))
             messages.append(
@@ -352,80 +445,40 @@ async def get_conversation(conversation_id: str, user_id: str) -> Optional[Dict[
     return {
         "id": conversation_row["id"],
         "created_at": conversation_row["created_at"],
-        "title": conversation_row.get("title") or "New Conversation",
-        "archived": bool(conversation_row.get("archived", False)),
+        "title": conversation_row["title"] or DEFAULT_CONVERSATION_TITLE,
+        "archived": conversation_row["archived"],
         "messages": messages,
         "usage": conversation_usage,
+        "has_more": has_more,
+        "next_before_id": message_rows[0]["id"] if has_more else None,
     }
 
 
 async def list_conversations(user_id: str, archived: bool = False) -> List[Dict[str, Any]]:
     """List conversation metadata for a single authenticated user."""
+    # Counts and totals are summed in Postgres from the persisted cost and
+    # total_tokens columns; drafts without messages are not returned.
     rows = await _rest_request(
-        "GET",
-        "conversations",
-        params={
-            "select": "id,created_at,title,archived",
-            "user_id": f"eq.{user_id}",
-            "archived": f"eq.{str(archived).lower()}",
-            "order": "created_at.desc",
-        },
-    )
-
-    if not rows:
-        return []
-
-    conversation_ids = [row["id"] for row in rows]
-    conversation_id_list = ",".join(conversation_ids)
-    message_rows = await _rest_request(
-        "GET",
-        "messages",
-        params={
-            "select": "conversation_id,role,stage1,stage2,stage3,cost,total_tokens",
-            "conversation_id": f"in.({conversation_id_list})",
-        },
+        "POST",
+        "rpc/list_conversation_summaries",
+        json_body={"p_user_id": user_id, "p_archived": archived},
     )
 
-    message_counts: Dict[str, int] = {}
-    usage_totals: Dict[str, Dict[str, Any]] = {
-        conversation_id: _empty_usage_summary() for conversation_id in conversation_ids
-    }
-    for row in message_rows or []:
-        conversation_id = row["conversation_id"]
-        message_counts[conversation_id] = message_counts.get(conversation_id, 0) + 1
-        if row.get("role") != "assistant":
-            continue
-
-        message_usage = _calculate_message_usage(
-            row.get("stage1"),
-            row.get("stage2"),
-            row.get("stage3"),
-            row.get("total_tokens"),
-            row.get("cost"),
-        )
-        _add_usage_summary(usage_totals[conversation_id], message_usage)
-
-    for usage in usage_totals.values():
-        usage["total_cost"] = round(usage["total_cost"], 8)
-
-    conversations: List[Dict[str, Any]] = []
-    for row in rows:
-        message_count = message_counts.get(row["id"], 0)
-        # Hide drafts (no messages yet) from sidebar list until first question.
-        if message_count <= 0:
-            continue
-        conversations.append(
-            {
-                "id": row["id"],
-                "created_at": row["created_at"],
-                "title": row.get("title") or "New Conversation",
-                "archived": bool(row.get("archived", False)),
-                "message_count": message_count,
-                "usage": usage_totals.get(row["id"], _empty_usage_summary()),
-            }
-        )
-
-    return conversations
+    # Every column is non-null in the RPC result, so index rows directly.
+    return [
+        {
+            "id": row["id"],
+            "created_at": row["created_at"],
+            "title": row["title"] or DEFAULT_CONVERSATION_TITLE,
+            "archived": row["archived"],
+            "message_count": row["message_count"],
+            "usage": {
+                "total_tokens": row["total_tokens"],
+                "total_cost": float(row["total_cost"]),
+            },
+        }
+        for row in rows or []
+    ]
 
 
 async def add_user_message(
@@ -436,25 +489,12 @@ async def add_user_message(
     id_session: str | None = None,
 ):
     """Add a user message to a user-owned conversation."""
-    conversation_row = await _get_conversation_row(conversation_id, user_id)
-    if conversation_row is None:
-        raise ValueError(f"Conversation {conversation_id} not found")
-
     payload = {
-        "conversation_id": conversation_id,
         "role": "user",
         "content": _encode_user_message_content(content, files),
+        "id_session": _normalize_session_id(id_session),
     }
-    normalized_session_id = _normalize_session_id(id_session)
-    if normalized_session_id is not None:
-        payload["id_session"] = normalized_session_id
-
-    await _rest_request(
-        "POST",
-        "messages",
-        json_body=payload,
-        prefer="return=minimal",
-    )
+    await _append_owned_messages(conversation_id, user_id, [payload])
 
 
 async def add_assistant_message(
@@ -464,15 +504,10 @@ async def add_assistant_message(
     stage2: List[Dict[str, Any]],
     stage3: Dict[str, Any],
     id_session: str | None = None,
-):
-    """Add the assistant's staged response to a user-owned conversation."""
-    conversation_row = await _get_conversation_row(conversation_id, user_id)
-    if conversation_row is None:
-        raise ValueError(f"Conversation {conversation_id} not found")
-
+) -> Dict[str, Any]:
+    """Add the assistant's staged response and return its usage summary."""
     message_usage = _calculate_message_usage(stage1, stage2, stage3)
     payload = {
-        "conversation_id": conversation_id,
         "role": "assistant",
         "content": None,
         "stage1": stage1,
@@ -480,35 +515,57 @@ async def add_assistant_message(
         "stage3": stage3,
         "cost": message_usage["total_cost"],
         "total_tokens": message_usage["total_tokens"],
+        "id_session": _normalize_session_id(id_session),
     }
+    await _append_owned_messages(conversation_id, user_id, [payload])
+    return message_usage
+
+
+async def append_turn(
+    conversation_id: str,
+    user_id: str,
+    content: str,
+    stage1: List[Dict[str, Any]],
+    stage2: List[Dict[str, Any]],
+    stage3: Dict[str, Any],
+    files: List[Dict[str, Any]] | None = None,
+    id_session: str | None = None,
+) -> Dict[str, Any]:
+    """Add a user message and its assistant reply; return the reply's usage."""
+    message_usage = _calculate_message_usage(stage1, stage2, stage3)
     normalized_session_id = _normalize_session_id(id_session)
-    if normalized_session_id is not None:
-        payload["id_session"] = normalized_session_id
+    # The RPC checks ownership and inserts the array in one statement, so
+    # ids (and ordering) follow the list order.
+    rows = [
+        {
+            "role": "user",
+            "content": _encode_user_message_content(content, files),
+            "stage1": None,
+            "stage2": None,
+            "stage3": None,
+            "cost": 0,
+            "total_tokens": 0,
+            "id_session": normalized_session_id,
+        },
+        {
+            "role": "assistant",
+            "content": None,
+            "stage1": stage1,
+            "stage2": stage2,
+            "stage3": stage3,
+            "cost": message_usage["total_cost"],
+            "total_tokens": message_usage["total_tokens"],
+            "id_session": normalized_session_id,
+        },
+    ]
 
-    await _rest_request(
-        "POST",
-        "messages",
-        json_body=payload,
-        prefer="return=minimal",
-    )
+    await _append_owned_messages(conversation_id, user_id, rows)
+    return message_usage
 
 
 async def update_conversation_title(conversation_id: str, user_id: str, title: str):
     """Update the title for a user-owned conversation."""
-    conversation_row = await _get_conversation_row(conversation_id, user_id)
-    if conversation_row is None:
-        raise ValueError(f"Conversation {conversation_id} not found")
-
-    await _rest_request(
-        "PATCH",
-        "conversations",
-        params={
-            "id": f"eq.{conversation_id}",
-            "user_id": f"eq.{user_id}",
-        },
-        json_body={"title": title},
-        prefer="return=minimal",
-    )
+    await _patch_owned_conversation(conversation_id, user_id, {"title": title})
 
 
 async def update_conversation_archived(
@@ -517,61 +574,7 @@ async def update_conversation_archived(
     archived: bool,
 ):
     """Update archived state for a user-owned conversation."""
-    conversation_row = await _get_conversation_row(conversation_id, user_id)
-    if conversation_row is None:
-        raise ValueError(f"Conversation {conversation_id} not found")
-
-    await _rest_request(
-        "PATCH",
-        "conversations",
-        params={
-            "id": f"eq.{conversation_id}",
-            "user_id": f"eq.{user_id}",
-        },
-        json_body={"archived": archived},
-        prefer="return=minimal",
-    )
-
-
-async def _ensure_credit_account(user_id: str, initial_credits: int = 0):
-    """Ensure a credit row exists for the user without overwriting current balance."""
-    await _rest_request(
-        "POST",
-        "account_credits",
-        params={"on_conflict": "user_id"},
-        json_body={"user_id": user_id, "credits": max(0, int(initial_credits))},
-        prefer="resolution=ignore-duplicates,return=minimal",
-    )
-
-
-async def _get_credit_row(user_id: str) -> Dict[str, Any] | None:
-    """Load account credits row for a user."""
-    rows = await _rest_request(
-        "GET",
-        "account_credits",
-        params={
-            "select": "user_id,credits,updated_at",
-            "user_id": f"eq.{user_id}",
-            "limit": "1",
-        },
-    )
-    if isinstance(rows, list) and rows:
-        return rows[0]
-    return None
-
-
-async def _set_credit_row(user_id: str, credits: int, updated_at: datetime):
-    """Persist account credits row values."""
-    await _rest_request(
-        "PATCH",
-        "account_credits",
-        params={"user_id": f"eq.{user_id}"},
-        json_body={
-            "credits": max(0, int(credits)),
-            "updated_at": updated_at.astimezone(timezone.utc).isoformat(),
-        },
-        prefer="return=minimal",
-    )
+    await _patch_owned_conversation(conversation_id, user_id, {"archived": archived})
 
 
 async def get_account_daily_credits(
@@ -580,36 +583,35 @@ async def get_account_daily_credits(
     timezone_name: str | None = None,
 ) -> int:
     """Return daily remaining credits, resetting once per local day boundary."""
-    safe_quota = max(0, int(daily_quota))
-    now_utc = _now_utc()
     reset_timezone = _resolve_daily_reset_timezone(timezone_name)
-    local_today = now_utc.astimezone(reset_timezone).date()
-
-    await _ensure_credit_account(user_id, safe_quota)
-    row = await _get_credit_row(user_id)
-    if row is None:
-        return safe_quota
-
-    updated_at = _parse_iso_datetime(row.get("updated_at"))
-    updated_local_date = (
-        updated_at.astimezone(reset_timezone).date()
-        if updated_at is not None
-        else None
+    # The RPC creates the row if needed and compares local dates in Postgres.
+    remaining = await _rest_request(
+        "POST",
+        "rpc/get_daily_credits",
+        json_body={
+            "p_user_id": user_id,
+            "p_daily_quota": max(0, int(daily_quota)),
+            "p_timezone": _timezone_key(reset_timezone),
+        },
     )
-    should_reset = updated_local_date is None or updated_local_date != local_today
-    if should_reset:
-        await _set_credit_row(user_id, safe_quota, now_utc)
-        return safe_quota
-
-    return max(0, _to_int(row.get("credits")))
+    return max(0, _to_int(remaining))
 
 
 async def reset_account_daily_credits(user_id: str, daily_quota: int) -> int:
     """Reset a user's daily credits balance to the provided quota."""
     safe_quota = max(0, int(daily_quota))
-    now_utc = _now_utc()
-    await _ensure_credit_account(user_id, safe_quota)
-    await _set_credit_row(user_id, safe_quota, now_utc)
+    # A merge upsert creates or overwrites the row in a single round trip.
+    await _rest_request(
+        "POST",
+        "account_credits",
+        params=_CREDIT_UPSERT_PARAMS,
+        json_body={
+            "user_id": user_id,
+            "credits": safe_quota,
+            "updated_at": _now_utc().isoformat(),
+        },
+        prefer=PREFER_MERGE_DUPLICATES,
+    )
     return safe_quota
 
 
@@ -620,23 +622,27 @@ async def consume_account_tokens(
     timezone_name: str | None = None,
 ) -> int:
     """Consume tokens from daily credits and return remaining balance."""
-    consume = max(0, int(tokens))
-    remaining = await get_account_daily_credits(
-        user_id,
-        daily_quota,
-        timezone_name=timezone_name,
-    )
-    if remaining <= 0:
-        raise ValueError(
-            "Daily credit has run out. You must wait until tomorrow for renewal."
+    reset_timezone = _resolve_daily_reset_timezone(timezone_name)
+    # The RPC locks the credit row, applies the daily reset and decrements in
+    # one statement, so concurrent turns cannot both spend the same balance.
+    try:
+        remaining = await _rest_request(
+            "POST",
+            "rpc/consume_daily_credits",
+            json_body={
+                "p_user_id": user_id,
+                "p_amount": max(0, int(tokens)),
+                "p_daily_quota": max(0, int(daily_quota)),
+                "p_timezone": _timezone_key(reset_timezone),
+            },
         )
-
-    if consume == 0:
-        return remaining
-
-    next_remaining = max(0, remaining - consume)
-    await _set_credit_row(user_id, next_remaining, _now_utc())
-    return next_remaining
+    except RuntimeError as exc:
+        if str(exc) == "INSUFFICIENT_CREDITS":
+            raise ValueError(
+                "Daily credit has run out. You must wait until tomorrow for renewal."
+            ) from exc
+        raise
+    return max(0, _to_int(remaining))
 
 
 async def upsert_billing_payment(
@@ -693,16 +699,17 @@ async def upsert_billing_payment(
     if not isinstance(payment_status, str):
         payment_status = "unknown"
 
+    processed_at = _now_utc().isoformat()
     normalized_paid_at = paid_at
     if not normalized_paid_at and payment_status in {"paid", "no_payment_required"}:
-        normalized_paid_at = datetime.now(timezone.utc).isoformat()
+        normalized_paid_at = processed_at
 
     normalized_next_payment_at = next_payment_at
 
     rows = await _rest_request(
         "POST",
         "billing_payments",
-        params={"on_conflict": "stripe_checkout_session_id"},
+        params=_BILLING_UPSERT_PARAMS,
         json_body={
             "stripe_checkout_session_id": session_id,
             "user_id": user_id,
@@ -719,10 +726,14 @@ async def upsert_billing_payment(
             "stripe_event_id": stripe_event_id,
             "paid_at": normalized_paid_at,
             "next_payment_at": normalized_next_payment_at,
-            "processed_at": datetime.now(timezone.utc).isoformat(),
-            "payload": checkout_session,
+            "processed_at": processed_at,
+            "payload": {
+                key: checkout_session[key]
+                for key in _BILLING_PAYLOAD_KEYS
+                if key in checkout_session
+            },
         },
-        prefer="resolution=merge-duplicates,return=representation",
+        prefer=PREFER_MERGE_DUPLICATES,
     )
 
     if isinstance(rows, list) and rows:
@@ -736,17 +747,11 @@ async def list_billing_payments(user_id: str, limit: int = 50) -> List[Dict[str,
     rows = await _rest_request(
         "GET",
         "billing_payments",
-        params={
-            "select": (
-                "stripe_checkout_session_id,plan,amount_total,currency,checkout_status,"
-                "payment_status,stripe_customer_id,stripe_subscription_id,"
-                "stripe_payment_intent_id,stripe_invoice_id,last_event_type,"
-                "stripe_event_id,paid_at,next_payment_at,processed_at,created_at"
-            ),
-            "user_id": f"eq.{user_id}",
-            "order": "processed_at.desc",
-            "limit": str(safe_limit),
-        },
+        params=[
+            *_BILLING_PAYMENT_LIST_PARAMS,
+            ("user_id", f"eq.{user_id}"),
+            ("limit", str(safe_limit)),
+        ],
     )
 
     if not isinstance(rows, list):
@@ -792,7 +797,7 @@ async def create_feedback_message(
             "user_email": user_email,
             "message": message,
         },
-        prefer="return=representation",
+        prefer=PREFER_REPRESENTATION,
     )
 
     if not isinstance(rows, list) or not rows:
@@ -806,11 +811,7 @@ async def list_feedback_messages(limit: int = 200) -> List[Dict[str, Any]]:
     rows = await _rest_request(
         "GET",
         "feedback_messages",
-        params={
-            "select": "user_email,message,created_at",
-            "order": "created_at.desc,id.desc",
-            "limit": str(safe_limit),
-        },
+        params=[*_FEEDBACK_LIST_PARAMS, ("limit", str(safe_limit))],
     )
 
     if not isinstance(rows, list):
@@ -1,13 +1,26 @@
 """Stage modules and shared council utilities."""
 
-from .shared import empty_usage_summary, summarize_council_usage
+from .shared import (
+    build_context_block,
+    empty_usage_summary,
+    fold_title_usage,
+    has_call_usage,
+    history_to_context_text,
+    merge_usage_summaries,
+    summarize_council_usage,
+)
 from .stage1 import stage1_collect_responses
 from .stage2 import calculate_aggregate_rankings, parse_ranking_from_text, stage2_collect_rankings
 from .stage3 import stage3_synthesize_final
 from .title import generate_conversation_title
 
 __all__ = [
+    "build_context_block",
     "empty_usage_summary",
+    "fold_title_usage",
+    "has_call_usage",
+    "history_to_context_text",
+    "merge_usage_summaries",
     "summarize_council_usage",
     "stage1_collect_responses",
     "stage2_collect_rankings",
@@ -53,6 +53,52 @@ def summarize_council_usage(
     return total
 
 
+def merge_usage_summaries(*summaries: Any) -> Dict[str, Any]:
+    """Return the field-wise sum of usage summaries."""
+    total = empty_usage_summary()
+    for summary in summaries:
+        if not isinstance(summary, dict):
+            continue
+        total["input_tokens"] += _to_int(summary.get("input_tokens"))
+        total["output_tokens"] += _to_int(summary.get("output_tokens"))
+        total["total_tokens"] += _to_int(summary.get("total_tokens"))
+        total["total_cost"] += _to_float(summary.get("total_cost")) or 0.0
+        total["model_calls"] += _to_int(summary.get("model_calls"))
+
+    total["total_cost"] = round(total["total_cost"], 8)
+    return total
+
+
+def has_call_usage(usage: Any) -> bool:
+    """Return whether a call usage payload reports any tokens or cost."""
+    return isinstance(usage, dict) and bool(
+        _to_int(usage.get("total_tokens")) or usage.get("cost")
+    )
+
+
+def fold_title_usage(council_usage: Any, title_usage: Any) -> Dict[str, Any]:
+    """Return council usage with the title-generation call folded in."""
+    council_usage = council_usage if isinstance(council_usage, dict) else {}
+    if not has_call_usage(title_usage):
+        # Failed, skipped or cached title calls report no usage; nothing to fold.
+        return {**empty_usage_summary(), **council_usage}
+
+    total = {
+        "input_tokens": _to_int(council_usage.get("input_tokens")),
+        "output_tokens": _to_int(council_usage.get("output_tokens")),
+        "total_tokens": _to_int(council_usage.get("total_tokens")),
+        "total_cost": _to_float(council_usage.get("total_cost")) or 0.0,
+        "model_calls": _to_int(council_usage.get("model_calls")),
+    }
+    _add_call_usage(total, title_usage)
+    total["total_cost"] = round(total["total_cost"], 8)
+    return total
+
+
+# Doubles as the allowed-role check: other roles are skipped.
+_HISTORY_ROLE_LABELS = {"user": "User", "assistant": "Assistant"}
+
+
 def history_to_context_text(
     conversation_history: List[Dict[str, str]] | None,
     max_chars: int = 5000,
@@ -61,20 +107,36 @@ def history_to_context_text(
     if not isinstance(conversation_history, list):
         return ""
 
-    lines: List[str] = []
-    for item in conversation_history:
+    # Walk newest-first and stop once the kept tail already exceeds max_chars,
+    # so older turns that would be truncated away are never formatted.
+    tail_lines: List[str] = []
+    tail_length = -2  # the first kept line has no "\n\n" separator
+    truncated = False
+    for item in reversed(conversation_history):
         if not isinstance(item, dict):
             continue
-        role = item.get("role")
-        content = item.get("content")
-        if role not in {"user", "assistant"}:
+        label = _HISTORY_ROLE_LABELS.get(item.get("role"))
+        if label is None:
             continue
-        if not isinstance(content, str) or not content.strip():
+        content = item.get("content")
+        if not isinstance(content, str) or not (stripped := content.strip()):
             continue
-        label = "User" if role == "user" else "Assistant"
-        lines.append(f"{label}: {content.strip()}")
-
-    context_text = "\n\n".join(lines)
-    if len(context_text) <= max_chars:
+        line = f"{label}: {stripped}"
+        tail_lines.append(line)
+        tail_length += len(line) + 2
+        if tail_length > max_chars:
+            truncated = True
+            break
+
+    tail_lines.reverse()
+    context_text = "\n\n".join(tail_lines)
+    if not truncated:
         return context_text
     return f"...{context_text[-max_chars:]}"
+
+
+def build_context_block(conversation_context_text: str) -> str:
+    """Wrap rendered history in the prompt section shared by stages 2 and 3."""
+    if not conversation_context_text:
+        return ""
+    return f"Conversation Context (previous turns):\n{conversation_context_text}\n\n"
@@ -6,7 +6,14 @@ from typing import Any, Dict, List, Tuple
 
 from ..config import COUNCIL_MODELS
 from ..services.openrouter.client import query_models_parallel
-from .shared import empty_usage_summary, history_to_context_text
+from .shared import build_context_block, empty_usage_summary, history_to_context_text
+
+FINAL_RANKING_MARKER = "FINAL RANKING:"
+# One pass yields every label plus whether it was written as a numbered entry.
+_RANKING_ENTRY_RE = re.compile(r"(\d+\.\s*)?(Response [A-Z])")
+_LABEL_RE = re.compile(r"Response [A-Z]")
+# Stage 1 answers are anonymized as "Response A".."Response Z".
+RESPONSE_LABELS = tuple(f"Response {chr(65 + index)}" for index in range(26))
 
 
 def parse_ranking_from_text(ranking_text: str) -> List[str]:
@@ -19,23 +26,22 @@ def parse_ranking_from_text(ranking_text: str) -> List[str]:
     Returns:
         List of response labels in ranked order.
     """
-    if "FINAL RANKING:" in ranking_text:
-        parts = ranking_text.split("FINAL RANKING:")
-        if len(parts) >= 2:
-            ranking_section = parts[1]
-            numbered_matches = re.findall(r"\d+\.\s*Response [A-Z]", ranking_section)
-            if numbered_matches:
-                labels: List[str] = []
-                for match in numbered_matches:
-                    label_match = re.search(r"Response [A-Z]", match)
-                    if label_match:
-                        labels.append(label_match.group())
-                return labels
+    # The ranking is the last block of the reply; anything before the final
+    # marker (including an echoed format example) is evaluation text.
+    marker_index = ranking_text.rfind(FINAL_RANKING_MARKER)
+    if marker_index == -1:
+        return _LABEL_RE.findall(ranking_text)
 
-            matches = re.findall(r"Response [A-Z]", ranking_section)
-            return matches
+    ranking_section = ranking_text[marker_index + len(FINAL_RANKING_MARKER):]
+    numbered_labels: List[str] = []
+    labels: List[str] = []
+    for number, label in _RANKING_ENTRY_RE.findall(ranking_section):
+        labels.append(label)
+        if number:
+            numbered_labels.append(label)
 
-    return re.findall(r"Response [A-Z]", ranking_text)
+    # Prefer the numbered list; fall back to label order for free-form rankings.
+    return numbered_labels or labels
 
 
 def calculate_aggregate_rankings(
@@ -43,27 +49,29 @@ def calculate_aggregate_rankings(
     label_to_model: Dict[str, str],
 ) -> List[Dict[str, Any]]:
     """Calculate aggregate rankings across all models."""
-    model_positions: dict[str, list[int]] = defaultdict(list)
+    # model -> [sum of positions, number of rankings]; only the mean is reported.
+    position_totals: dict[str, list[int]] = defaultdict(lambda: [0, 0])
 
     for ranking in stage2_results:
-        ranking_text = ranking.get("ranking", "")
-        parsed_ranking = parse_ranking_from_text(ranking_text)
+        # Stage 2 already parsed each reply; only older stored rows lack it.
+        parsed_ranking = ranking.get("parsed_ranking")
+        if not isinstance(parsed_ranking, list):
+            parsed_ranking = parse_ranking_from_text(ranking.get("ranking", ""))
 
         for position, label in enumerate(parsed_ranking, start=1):
-            if label in label_to_model:
-                model_name = label_to_model[label]
-                model_positions[model_name].append(position)
+            model_name = label_to_model.get(label)
+            if model_name is not None:
+                totals = position_totals[model_name]
+                totals[0] += position
+                totals[1] += 1
 
     aggregate: List[Dict[str, Any]] = []
-    for model, positions in model_positions.items():
-        if not positions:
-            continue
-        avg_rank = sum(positions) / len(positions)
+    for model, (position_sum, rankings_count) in position_totals.items():
         aggregate.append(
             {
                 "model": model,
-                "average_rank": round(avg_rank, 2),
-                "rankings_count": len(positions),
+                "average_rank": round(position_sum / rankings_count, 2),
+                "rankings_count": rankings_count,
             }
         )
 
@@ -78,6 +86,7 @@ async def stage2_collect_rankings(
     session_id: str | None = None,
     council_models: List[str] | None = None,
     openrouter_user: str | None = None,
+    conversation_context_text: str | None = None,
 ) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
     """
     Stage 2: each model ranks the anonymized responses.
@@ -85,31 +94,28 @@ async def stage2_collect_rankings(
     Args:
         user_query: The original user query.
         stage1_results: Results from Stage 1.
+        conversation_context_text: Pre-rendered history text; rendered from
+            conversation_history when omitted.
 
     Returns:
         Tuple of (rankings list, label_to_model mapping).
     """
-    labels = [chr(65 + i) for i in range(len(stage1_results))]
+    labels = RESPONSE_LABELS[: len(stage1_results)]
 
     label_to_model = {
-        f"Response {label}": result["model"]
-        for label, result in zip(labels, stage1_results)
+        label: result["model"] for label, result in zip(labels, stage1_results)
     }
 
     responses_text = "\n\n".join(
         [
-            f"Response {label}:\n{result['response']}"
+            f"{label}:\n{result['response']}"
             for label, result in zip(labels, stage1_results)
         ]
     )
 
-    conversation_context_text = history_to_context_text(conversation_history)
-    context_block = ""
-    if conversation_context_text:
-        context_block = f"""Conversation Context (previous turns):
-{conversation_context_text}
-
-"""
+    if conversation_context_text is None:
+        conversation_context_text = history_to_context_text(conversation_history)
+    context_block = build_context_block(conversation_context_text)
 
     ranking_prompt = f"""You are evaluating different responses to the following question:
 
@@ -4,7 +4,7 @@ from typing import Any, Dict, List
 
 from ..config import CHAIRMAN_MODEL
 from ..services.openrouter.client import query_model
-from .shared import empty_usage_summary, history_to_context_text
+from .shared import build_context_block, empty_usage_summary, history_to_context_text
 
 
 async def stage3_synthesize_final(
@@ -17,6 +17,7 @@ async def stage3_synthesize_final(
     user_attachments: List[Dict[str, Any]] | None = None,
     plugins: List[Dict[str, Any]] | None = None,
     chairman_model: str | None = None,
+    conversation_context_text: str | None = None,
 ) -> Dict[str, Any]:
     """
     Stage 3: chairman synthesizes final response.
@@ -25,6 +26,8 @@ async def stage3_synthesize_final(
         user_query: The original user query.
         stage1_results: Individual model responses from Stage 1.
         stage2_results: Rankings from Stage 2.
+        conversation_context_text: Pre-rendered history text; rendered from
+            conversation_history when omitted.
 
     Returns:
         Dict with model and response keys.
@@ -43,13 +46,9 @@ async def stage3_synthesize_final(
         ]
     )
 
-    conversation_context_text = history_to_context_text(conversation_history)
-    context_block = ""
-    if conversation_context_text:
-        context_block = f"""Conversation Context (previous turns):
-{conversation_context_text}
-
-"""
+    if conversation_context_text is None:
+        conversation_context_text = history_to_context_text(conversation_history)
+    context_block = build_context_block(conversation_context_text)
 
     chairman_prompt = f"""You are the Chairman of an LLM Council. Multiple AI models have provided responses to a user's question, and then ranked each other's responses.
 
@@ -1,10 +1,16 @@
 """Conversation title generation."""
 
+import hashlib
 from typing import Any, Dict
 
+from cachetools import TTLCache
+
 from ..services.openrouter.client import query_model
 from .shared import empty_usage_summary
 
+# Titles depend only on the first message, so identical openers reuse one call.
+_title_cache: TTLCache = TTLCache(maxsize=1024, ttl=60 * 60)
+
 
 async def generate_conversation_title(
     user_query: str,
@@ -20,6 +26,12 @@ async def generate_conversation_title(
     Returns:
         Dict with title and usage summary.
     """
+    cache_key = hashlib.blake2b(user_query.encode("utf-8"), digest_size=16).digest()
+    cached_title = _title_cache.get(cache_key)
+    if cached_title is not None:
+        # No model call was made, so nothing is billed for this title.
+        return {"title": cached_title, "usage": empty_usage_summary()}
+
     title_prompt = f"""Generate a very short title (3-5 words maximum) that summarizes the following question.
 The title should be concise and descriptive. Do not use quotes or punctuation in the title.
 
@@ -50,6 +62,9 @@ Title:"""
     if len(title) > 50:
         title = title[:47] + "..."
 
+    if title:
+        _title_cache[cache_key] = title
+
     return {
         "title": title,
         "usage": response.get("usage", empty_usage_summary()),
@@ -83,6 +83,9 @@ alter table public.billing_payments
 create index if not exists conversations_user_id_created_at_idx
   on public.conversations (user_id, created_at desc);
 
+create index if not exists conversations_user_archived_created_at_idx
+  on public.conversations (user_id, archived, created_at desc);
+
 create index if not exists messages_conversation_id_created_at_idx
   on public.messages (conversation_id, created_at asc, id asc);
 
@@ -356,6 +359,289 @@ begin
 end;
 $$;
 
+create or replace function public.append_conversation_messages(
+  p_user_id uuid,
+  p_conversation_id uuid,
+  p_messages jsonb
+)
+returns integer
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  v_inserted integer;
+begin
+  if auth.role() <> 'service_role' and auth.uid() is distinct from p_user_id then
+    raise exception 'FORBIDDEN';
+  end if;
+
+  if not exists (
+    select 1
+    from public.conversations
+    where id = p_conversation_id
+      and user_id = p_user_id
+  ) then
+    raise exception 'CONVERSATION_NOT_FOUND';
+  end if;
+
+  insert into public.messages (
+    conversation_id,
+    id_session,
+    role,
+    content,
+    stage1,
+    stage2,
+    stage3,
+    cost,
+    total_tokens
+  )
+  select
+    p_conversation_id,
+    m.id_session,
+    m.role,
+    m.content,
+    m.stage1,
+    m.stage2,
+    m.stage3,
+    coalesce(m.cost, 0),
+    coalesce(m.total_tokens, 0)
+  from rows from (
+    jsonb_to_recordset(p_messages) as (
+      id_session text,
+      role text,
+      content text,
+      stage1 jsonb,
+      stage2 jsonb,
+      stage3 jsonb,
+      cost numeric,
+      total_tokens integer
+    )
+  ) with ordinality as m(
+    id_session,
+    role,
+    content,
+    stage1,
+    stage2,
+    stage3,
+    cost,
+    total_tokens,
+    position
+  )
+  order by m.position;
+
+  get diagnostics v_inserted = row_count;
+  return v_inserted;
+end;
+$$;
+
+drop function if exists public.list_conversation_summaries(uuid, boolean);
+
+create or replace function public.list_conversation_summaries(
+  p_user_id uuid,
+  p_archived boolean default false
+)
+returns table (
+  id uuid,
+  created_at timestamptz,
+  title text,
+  archived boolean,
+  message_count bigint,
+  total_tokens bigint,
+  total_cost numeric
+)
+language plpgsql
+stable
+security definer
+set search_path = public
+as $$
+begin
+  if auth.role() <> 'service_role' and auth.uid() is distinct from p_user_id then
+    raise exception 'FORBIDDEN';
+  end if;
+
+  -- Totals come from the persisted cost/total_tokens columns only, so the
+  -- stage JSONB payloads are never read for the sidebar listing.
+  return query
+  select
+    c.id,
+    c.created_at,
+    c.title,
+    c.archived,
+    count(m.id) as message_count,
+    sum(m.total_tokens)::bigint as total_tokens,
+    sum(m.cost) as total_cost
+  from public.conversations c
+  join public.messages m on m.conversation_id = c.id
+  where c.user_id = p_user_id
+    and c.archived = p_archived
+  group by c.id
+  order by c.created_at desc;
+end;
+$$;
+
+drop function if exists public.get_conversation_with_messages(uuid, uuid);
+
+create or replace function public.get_conversation_with_messages(
+  p_conversation_id uuid,
+  p_user_id uuid,
+  p_limit integer default null,
+  p_before_id bigint default null
+)
+returns jsonb
+language plpgsql
+stable
+security definer
+set search_path = public
+as $$
+declare
+  v_result jsonb;
+begin
+  if auth.role() <> 'service_role' and auth.uid() is distinct from p_user_id then
+    raise exception 'FORBIDDEN';
+  end if;
+
+  select jsonb_build_object(
+    'conversation', jsonb_build_object(
+      'id', c.id,
+      'created_at', c.created_at,
+      'title', c.title,
+      'archived', c.archived
+    ),
+    -- A null p_limit returns the whole history. Otherwise the newest
+    -- p_limit messages older than p_before_id are returned, oldest first.
+    'messages', coalesce(
+      (
+        select jsonb_agg(
+          jsonb_build_object(
+            'id', m.id,
+            'role', m.role,
+            'id_session', m.id_session,
+            'content', m.content,
+            'stage1', m.stage1,
+            'stage2', m.stage2,
+            'stage3', m.stage3,
+            'cost', m.cost,
+            'total_tokens', m.total_tokens,
+            'created_at', m.created_at
+          )
+          order by m.created_at, m.id
+        )
+        from (
+          select *
+          from public.messages
+          where conversation_id = c.id
+            and (p_before_id is null or id < p_before_id)
+          order by created_at desc, id desc
+          limit p_limit
+        ) m
+      ),
+      '[]'::jsonb
+    )
+  )
+    into v_result
+  from public.conversations c
+  where c.id = p_conversation_id
+    and c.user_id = p_user_id;
+
+  return v_result;
+end;
+$$;
+
+create or replace function public.get_daily_credits(
+  p_user_id uuid,
+  p_daily_quota integer,
+  p_timezone text default 'UTC'
+)
+returns integer
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  v_quota integer := greatest(0, p_daily_quota);
+  v_credits integer;
+  v_updated_at timestamptz;
+begin
+  if auth.role() <> 'service_role' and auth.uid() is distinct from p_user_id then
+    raise exception 'FORBIDDEN';
+  end if;
+
+  insert into public.account_credits (user_id, credits)
+  values (p_user_id, v_quota)
+  on conflict (user_id) do nothing;
+
+  select credits, updated_at
+    into v_credits, v_updated_at
+  from public.account_credits
+  where user_id = p_user_id
+  for update;
+
+  -- Balances reset to the quota once per calendar day in the user's timezone.
+  if (v_updated_at at time zone p_timezone)::date
+      <> (now() at time zone p_timezone)::date then
+    update public.account_credits
+      set credits = v_quota,
+          updated_at = now()
+    where user_id = p_user_id;
+    return v_quota;
+  end if;
+
+  return greatest(0, v_credits);
+end;
+$$;
+
+create or replace function public.consume_daily_credits(
+  p_user_id uuid,
+  p_amount integer,
+  p_daily_quota integer,
+  p_timezone text default 'UTC'
+)
+returns integer
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  v_quota integer := greatest(0, p_daily_quota);
+  v_credits integer;
+  v_updated_at timestamptz;
+begin
+  if auth.role() <> 'service_role' and auth.uid() is distinct from p_user_id then
+    raise exception 'FORBIDDEN';
+  end if;
+
+  insert into public.account_credits (user_id, credits)
+  values (p_user_id, v_quota)
+  on conflict (user_id) do nothing;
+
+  select credits, updated_at
+    into v_credits, v_updated_at
+  from public.account_credits
+  where user_id = p_user_id
+  for update;
+
+  -- Balances reset to the quota once per calendar day in the user's timezone.
+  if (v_updated_at at time zone p_timezone)::date
+      <> (now() at time zone p_timezone)::date then
+    v_credits := v_quota;
+  end if;
+
+  if v_credits <= 0 then
+    raise exception 'INSUFFICIENT_CREDITS';
+  end if;
+
+  v_credits := greatest(0, v_credits - greatest(0, p_amount));
+
+  update public.account_credits
+    set credits = v_credits,
+        updated_at = now()
+  where user_id = p_user_id;
+
+  return v_credits;
+end;
+$$;
+
 grant usage on schema public to authenticated;
 grant select, insert, update, delete on public.conversations to authenticated;
 grant select, insert, update, delete on public.messages to authenticated;
@@ -367,3 +653,8 @@ grant usage, select on sequence public.feedback_messages_id_seq to authenticated
 grant execute on function public.get_account_credits(uuid) to authenticated, service_role;
 grant execute on function public.add_account_credits(uuid, integer) to authenticated, service_role;
 grant execute on function public.consume_account_credit(uuid) to authenticated, service_role;
+grant execute on function public.append_conversation_messages(uuid, uuid, jsonb) to authenticated, service_role;
+grant execute on function public.list_conversation_summaries(uuid, boolean) to authenticated, service_role;
+grant execute on function public.get_conversation_with_messages(uuid, uuid, integer, bigint) to authenticated, service_role;
+grant execute on function public.consume_daily_credits(uuid, integer, integer, text) to authenticated, service_role;
+grant execute on function public.get_daily_credits(uuid, integer, text) to authenticated, service_role;
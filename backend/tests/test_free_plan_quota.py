@@ -1,6 +1,7 @@
 """Tests for free-plan daily query limit semantics."""
 
-from datetime import datetime, timezone
+import asyncio
+import time
 import unittest
 from unittest.mock import AsyncMock, Mock, call, patch
 
@@ -11,71 +12,81 @@ from backend.services.supabase import storage
 
 
 class StorageDailyQuotaTimezoneTests(unittest.IsolatedAsyncioTestCase):
-    async def test_get_account_daily_credits_resets_at_local_midnight_boundary(self):
-        now_utc = datetime(2026, 2, 20, 8, 30, tzinfo=timezone.utc)
-        # 07:59 UTC is still previous day in America/Los_Angeles.
-        row = {
-            "user_id": "user-1",
-            "credits": 1,
-            "updated_at": "2026-02-20T07:59:00+00:00",
-        }
+    async def test_get_account_daily_credits_resets_in_users_local_timezone(self):
+        rest_mock = AsyncMock(return_value=3)
 
-        with (
-            patch("backend.services.supabase.storage._now_utc", return_value=now_utc),
-            patch(
-                "backend.services.supabase.storage._ensure_credit_account",
-                new=AsyncMock(),
-            ),
-            patch(
-                "backend.services.supabase.storage._get_credit_row",
-                new=AsyncMock(return_value=row),
-            ),
-            patch(
-                "backend.services.supabase.storage._set_credit_row",
-                new=AsyncMock(),
-            ) as set_credit_row_mock,
-        ):
+        with patch("backend.services.supabase.storage._rest_request", new=rest_mock):
             remaining = await storage.get_account_daily_credits(
                 "user-1",
                 3,
-                timezone_name="America/Los_Angeles",
+                timezone_name=" America/Los_Angeles ",
             )
 
         self.assertEqual(remaining, 3)
-        set_credit_row_mock.assert_awaited_once_with("user-1", 3, now_utc)
-
-    async def test_get_account_daily_credits_keeps_balance_within_same_local_day(self):
-        now_utc = datetime(2026, 2, 20, 8, 30, tzinfo=timezone.utc)
-        # 08:05 UTC is the same local day in America/Los_Angeles as 08:30 UTC.
-        row = {
-            "user_id": "user-1",
-            "credits": 2,
-            "updated_at": "2026-02-20T08:05:00+00:00",
-        }
+        rest_mock.assert_awaited_once_with(
+            "POST",
+            "rpc/get_daily_credits",
+            json_body={
+                "p_user_id": "user-1",
+                "p_daily_quota": 3,
+                "p_timezone": "America/Los_Angeles",
+            },
+        )
 
-        with (
-            patch("backend.services.supabase.storage._now_utc", return_value=now_utc),
-            patch(
-                "backend.services.supabase.storage._ensure_credit_account",
-                new=AsyncMock(),
-            ),
-            patch(
-                "backend.services.supabase.storage._get_credit_row",
-                new=AsyncMock(return_value=row),
-            ),
-            patch(
-                "backend.services.supabase.storage._set_credit_row",
-                new=AsyncMock(),
-            ) as set_credit_row_mock,
-        ):
+    async def test_consume_account_tokens_uses_atomic_rpc_with_resolved_timezone(self):
+        rest_mock = AsyncMock(return_value=2)
+
+        with patch("backend.services.supabase.storage._rest_request", new=rest_mock):
+            remaining = await storage.consume_account_tokens(
+                "user-1", 1, 3, timezone_name="America/Los_Angeles"
+            )
+
+        self.assertEqual(remaining, 2)
+        rest_mock.assert_awaited_once_with(
+            "POST",
+            "rpc/consume_daily_credits",
+            json_body={
+                "p_user_id": "user-1",
+                "p_amount": 1,
+                "p_daily_quota": 3,
+                "p_timezone": "America/Los_Angeles",
+            },
+        )
+
+    async def test_consume_account_tokens_maps_exhausted_balance_to_value_error(self):
+        rest_mock = AsyncMock(side_effect=RuntimeError("INSUFFICIENT_CREDITS"))
+
+        with patch("backend.services.supabase.storage._rest_request", new=rest_mock):
+            with self.assertRaises(ValueError):
+                await storage.consume_account_tokens("user-1", 1, 3, timezone_name="Bad/Zone")
+
+        self.assertEqual(rest_mock.await_args.kwargs["json_body"]["p_timezone"], "UTC")
+
+    async def test_get_account_daily_credits_falls_back_to_utc_and_clamps_balance(self):
+        rest_mock = AsyncMock(return_value=-1)
+
+        with patch("backend.services.supabase.storage._rest_request", new=rest_mock):
             remaining = await storage.get_account_daily_credits(
                 "user-1",
                 3,
-                timezone_name="America/Los_Angeles",
+                timezone_name="Not/AZone",
             )
 
-        self.assertEqual(remaining, 2)
-        set_credit_row_mock.assert_not_awaited()
+        self.assertEqual(remaining, 0)
+        self.assertEqual(rest_mock.await_args.kwargs["json_body"]["p_timezone"], "UTC")
+
+    async def test_reset_account_daily_credits_upserts_in_one_request(self):
+        rest_mock = AsyncMock(return_value=[])
+
+        with patch("backend.services.supabase.storage._rest_request", new=rest_mock):
+            credits = await storage.reset_account_daily_credits("user-1", 5)
+
+        self.assertEqual(credits, 5)
+        rest_mock.assert_awaited_once()
+        self.assertEqual(rest_mock.await_args.args, ("POST", "account_credits"))
+        body = rest_mock.await_args.kwargs["json_body"]
+        self.assertEqual((body["user_id"], body["credits"]), ("user-1", 5))
+        self.assertIn("updated_at", body)
 
 
 class FreePlanQuotaEndpointTests(unittest.IsolatedAsyncioTestCase):
@@ -100,14 +111,15 @@ class FreePlanQuotaEndpointTests(unittest.IsolatedAsyncioTestCase):
     @staticmethod
     def _request_stub():
         class RequestStub:
-            async def is_disconnected(self):
-                return False
+            async def receive(self):
+                # Client stays connected for the whole stream.
+                await asyncio.Event().wait()
 
         return RequestStub()
 
     async def test_send_message_first_execution_consumes_after_stage1_success(self):
         consume_mock = AsyncMock(return_value=2)
-        add_user_message_mock = AsyncMock()
+        append_turn_mock = AsyncMock()
         stage1_mock = AsyncMock(
             return_value=[
                 {
@@ -128,7 +140,7 @@ class FreePlanQuotaEndpointTests(unittest.IsolatedAsyncioTestCase):
         ordered_calls = Mock()
         ordered_calls.attach_mock(stage1_mock, "stage1")
         ordered_calls.attach_mock(consume_mock, "consume")
-        ordered_calls.attach_mock(add_user_message_mock, "add_user")
+        ordered_calls.attach_mock(append_turn_mock, "persist_turn")
 
         with (
             patch(
@@ -148,7 +160,7 @@ class FreePlanQuotaEndpointTests(unittest.IsolatedAsyncioTestCase):
                 new=AsyncMock(return_value=([], [], False)),
             ),
             patch("backend.main.resolve_message_prompt", return_value="Hello"),
-            patch("backend.main.storage.add_user_message", new=add_user_message_mock),
+            patch("backend.main.storage.append_turn", new=append_turn_mock),
             patch(
                 "backend.main.generate_conversation_title",
                 new=AsyncMock(
@@ -160,7 +172,6 @@ class FreePlanQuotaEndpointTests(unittest.IsolatedAsyncioTestCase):
             patch("backend.main.stage1_collect_responses", new=stage1_mock),
             patch("backend.main.stage2_collect_rankings", new=stage2_mock),
             patch("backend.main.stage3_synthesize_final", new=stage3_mock),
-            patch("backend.main.storage.add_assistant_message", new=AsyncMock()),
             patch("backend.main.storage.get_conversation", new=AsyncMock(return_value={})),
         ):
             response = await main.send_message(
@@ -179,13 +190,13 @@ class FreePlanQuotaEndpointTests(unittest.IsolatedAsyncioTestCase):
         call_names = [entry[0] for entry in ordered_calls.mock_calls]
         self.assertIn("consume", call_names)
         self.assertIn("stage1", call_names)
-        self.assertIn("add_user", call_names)
+        self.assertIn("persist_turn", call_names)
         self.assertLess(call_names.index("stage1"), call_names.index("consume"))
-        self.assertLess(call_names.index("consume"), call_names.index("add_user"))
+        self.assertLess(call_names.index("consume"), call_names.index("persist_turn"))
 
     async def test_send_message_first_execution_does_not_consume_when_stage1_has_no_successes(self):
         consume_mock = AsyncMock(return_value=2)
-        add_user_message_mock = AsyncMock()
+        append_turn_mock = AsyncMock()
 
         with (
             patch(
@@ -205,7 +216,7 @@ class FreePlanQuotaEndpointTests(unittest.IsolatedAsyncioTestCase):
                 new=AsyncMock(return_value=([], [], False)),
             ),
             patch("backend.main.resolve_message_prompt", return_value="Hello"),
-            patch("backend.main.storage.add_user_message", new=add_user_message_mock),
+            patch("backend.main.storage.append_turn", new=append_turn_mock),
             patch(
                 "backend.main.generate_conversation_title",
                 new=AsyncMock(
@@ -215,7 +226,6 @@ class FreePlanQuotaEndpointTests(unittest.IsolatedAsyncioTestCase):
             patch("backend.main.storage.update_conversation_title", new=AsyncMock()),
             patch("backend.main.storage.consume_account_tokens", new=consume_mock),
             patch("backend.main.stage1_collect_responses", new=AsyncMock(return_value=[])),
-            patch("backend.main.storage.add_assistant_message", new=AsyncMock()),
             patch("backend.main.storage.get_conversation", new=AsyncMock(return_value={})),
         ):
             response = await main.send_message(
@@ -226,12 +236,12 @@ class FreePlanQuotaEndpointTests(unittest.IsolatedAsyncioTestCase):
             )
 
         consume_mock.assert_not_awaited()
-        add_user_message_mock.assert_awaited_once()
+        append_turn_mock.assert_awaited_once()
         self.assertEqual(response["credits"], 3)
 
-    async def test_send_message_first_execution_consume_failure_does_not_persist_user_message(self):
+    async def test_send_message_first_execution_consume_failure_does_not_persist_turn(self):
         consume_mock = AsyncMock(side_effect=ValueError("limit reached"))
-        add_user_message_mock = AsyncMock()
+        append_turn_mock = AsyncMock()
         title_mock = AsyncMock(
             return_value={"title": "Test", "usage": main.empty_usage_summary()}
         )
@@ -254,7 +264,7 @@ class FreePlanQuotaEndpointTests(unittest.IsolatedAsyncioTestCase):
                 new=AsyncMock(return_value=([], [], False)),
             ),
             patch("backend.main.resolve_message_prompt", return_value="Hello"),
-            patch("backend.main.storage.add_user_message", new=add_user_message_mock),
+            patch("backend.main.storage.append_turn", new=append_turn_mock),
             patch("backend.main.generate_conversation_title", new=title_mock),
             patch("backend.main.storage.update_conversation_title", new=AsyncMock()),
             patch("backend.main.storage.consume_account_tokens", new=consume_mock),
@@ -280,7 +290,7 @@ class FreePlanQuotaEndpointTests(unittest.IsolatedAsyncioTestCase):
                 )
 
         self.assertEqual(raised.exception.status_code, 402)
-        add_user_message_mock.assert_not_awaited()
+        append_turn_mock.assert_not_awaited()
         title_mock.assert_not_awaited()
 
     async def test_send_message_first_execution_limit_returns_structured_payload(self):
@@ -318,6 +328,40 @@ class FreePlanQuotaEndpointTests(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(detail.get("timezone"), "America/Sao_Paulo")
         self.assertIsInstance(detail.get("reset_at"), str)
 
+    async def test_send_message_pro_loads_conversation_and_balance_concurrently(self):
+        in_flight = 0
+        peak_in_flight = 0
+
+        async def tracked(result):
+            nonlocal in_flight, peak_in_flight
+            in_flight += 1
+            peak_in_flight = max(peak_in_flight, in_flight)
+            await asyncio.sleep(0)
+            in_flight -= 1
+            return result
+
+        with (
+            patch(
+                "backend.main.extract_message_content_and_files",
+                new=AsyncMock(return_value=("Hello", [])),
+            ),
+            patch(
+                "backend.main.get_owned_conversation",
+                new=lambda *_: tracked({"id": "conv-1", "messages": []}),
+            ),
+            patch("backend.main._get_remaining_daily_tokens", new=lambda _: tracked(0)),
+        ):
+            with self.assertRaises(HTTPException) as raised:
+                await main.send_message(
+                    conversation_id="conv-1",
+                    http_request=object(),
+                    user_timezone="UTC",
+                    user=self._pro_user(),
+                )
+
+        self.assertEqual(raised.exception.status_code, 402)
+        self.assertEqual(peak_in_flight, 2)
+
     async def test_send_message_existing_conversation_continues_without_new_query_consumption(self):
         consume_mock = AsyncMock(return_value=999)
         remaining_mock = AsyncMock(return_value=0)
@@ -345,7 +389,7 @@ class FreePlanQuotaEndpointTests(unittest.IsolatedAsyncioTestCase):
             patch("backend.main.storage.add_user_message", new=AsyncMock()),
             patch("backend.main.storage.consume_account_tokens", new=consume_mock),
             patch("backend.main.stage1_collect_responses", new=AsyncMock(return_value=[])),
-            patch("backend.main.storage.add_assistant_message", new=AsyncMock()),
+            patch("backend.main.storage.append_turn", new=AsyncMock()),
             patch("backend.main.storage.get_conversation", new=AsyncMock(return_value={})),
         ):
             response = await main.send_message(
@@ -430,7 +474,7 @@ class FreePlanQuotaEndpointTests(unittest.IsolatedAsyncioTestCase):
             patch("backend.main.stage1_collect_responses", new=AsyncMock(return_value=[])),
             patch("backend.main.stage2_collect_rankings", new=stage2_mock),
             patch("backend.main.stage3_synthesize_final", new=stage3_mock),
-            patch("backend.main.storage.add_assistant_message", new=AsyncMock()),
+            patch("backend.main.storage.append_turn", new=AsyncMock()),
             patch("backend.main.storage.get_conversation", new=AsyncMock(return_value={})),
         ):
             response = await main.send_message_stream(
@@ -489,7 +533,7 @@ class FreePlanQuotaEndpointTests(unittest.IsolatedAsyncioTestCase):
             patch("backend.main.stage1_collect_responses", new=stage1_mock),
             patch("backend.main.stage2_collect_rankings", new=stage2_mock),
             patch("backend.main.stage3_synthesize_final", new=stage3_mock),
-            patch("backend.main.storage.add_assistant_message", new=AsyncMock()),
+            patch("backend.main.storage.append_turn", new=AsyncMock()),
             patch("backend.main.storage.get_conversation", new=AsyncMock(return_value={})),
             patch(
                 "backend.main.get_council_models_for_plan",
@@ -563,7 +607,7 @@ class FreePlanQuotaEndpointTests(unittest.IsolatedAsyncioTestCase):
             patch("backend.main.stage2_collect_rankings", new=stage2_mock),
             patch("backend.main.stage3_synthesize_final", new=stage3_mock),
             patch("backend.main.storage.consume_account_tokens", new=consume_mock),
-            patch("backend.main.storage.add_assistant_message", new=AsyncMock()),
+            patch("backend.main.storage.append_turn", new=AsyncMock()),
             patch("backend.main.storage.get_conversation", new=AsyncMock(return_value={})),
             patch(
                 "backend.main.get_council_models_for_plan",
@@ -636,7 +680,7 @@ class FreePlanQuotaEndpointTests(unittest.IsolatedAsyncioTestCase):
             patch("backend.main.stage1_collect_responses", new=stage1_mock),
             patch("backend.main.stage2_collect_rankings", new=stage2_mock),
             patch("backend.main.stage3_synthesize_final", new=stage3_mock),
-            patch("backend.main.storage.add_assistant_message", new=AsyncMock()),
+            patch("backend.main.storage.append_turn", new=AsyncMock()),
             patch("backend.main.storage.get_conversation", new=AsyncMock(return_value={})),
             patch(
                 "backend.main.get_council_models_for_plan",
@@ -665,6 +709,433 @@ class FreePlanQuotaEndpointTests(unittest.IsolatedAsyncioTestCase):
             selected_chairman,
         )
 
+    async def test_send_message_stream_persists_partial_turn_when_starlette_cancels(self):
+        stage1_started = asyncio.Event()
+
+        async def hanging_stage1(*args, **kwargs):
+            stage1_started.set()
+            await asyncio.Event().wait()
+
+        async def receive():
+            # Starlette's disconnect listener consumes this under ASGI 2.3.
+            await stage1_started.wait()
+            return {"type": "http.disconnect"}
+
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        stage2_mock = AsyncMock(return_value=([], {}))
+        append_turn_mock = AsyncMock()
+
+        with (
+            patch(
+                "backend.main.extract_message_content_and_files",
+                new=AsyncMock(return_value=("Continue", [])),
+            ),
+            patch(
+                "backend.main.get_owned_conversation",
+                new=AsyncMock(
+                    return_value={
+                        "id": "conv-1",
+                        "messages": [{"role": "user", "content": "Earlier message"}],
+                    }
+                ),
+            ),
+            patch("backend.main._get_remaining_daily_queries", new=AsyncMock(return_value=2)),
+            patch(
+                "backend.main.prepare_uploaded_files_for_model",
+                new=AsyncMock(return_value=([], [], False)),
+            ),
+            patch("backend.main.resolve_message_prompt", return_value="Continue"),
+            patch("backend.main.storage.add_user_message", new=AsyncMock()),
+            patch("backend.main.stage1_collect_responses", new=hanging_stage1),
+            patch("backend.main.stage2_collect_rankings", new=stage2_mock),
+            patch("backend.main.storage.append_turn", new=append_turn_mock),
+        ):
+            response = await main.send_message_stream(
+                conversation_id="conv-1",
+                http_request=self._request_stub(),
+                user_timezone="America/New_York",
+                user=self._free_user(),
+            )
+            scope = {"type": "http", "asgi": {"spec_version": "2.3"}}
+            await asyncio.wait_for(response(scope, receive, send), timeout=5)
+
+        bodies = [message.get("body") for message in sent if message["type"] == "http.response.body"]
+        self.assertIn(b'data: {"type":"stage1_start"}\n\n', bodies)
+        stage2_mock.assert_not_awaited()
+        append_turn_mock.assert_awaited_once()
+        stage3_result = append_turn_mock.await_args.args[5]
+        self.assertTrue(stage3_result.get("cancelled"))
+
+    async def test_send_message_rejects_when_user_has_too_many_runs_in_flight(self):
+        extract_mock = AsyncMock(return_value=("Hello", []))
+        inflight = {
+            "user-free-1": {
+                f"req-{index}": time.monotonic()
+                for index in range(main.MAX_INFLIGHT_MESSAGES_PER_USER)
+            }
+        }
+
+        with (
+            patch("backend.main._inflight_messages", new=inflight),
+            patch("backend.main.extract_message_content_and_files", new=extract_mock),
+        ):
+            with self.assertRaises(HTTPException) as raised:
+                await main.send_message(
+                    conversation_id="conv-1",
+                    http_request=object(),
+                    user_timezone="UTC",
+                    user=self._free_user(),
+                )
+
+        self.assertEqual(raised.exception.status_code, 429)
+        extract_mock.assert_not_awaited()
+        self.assertEqual(len(inflight["user-free-1"]), main.MAX_INFLIGHT_MESSAGES_PER_USER)
+
+    async def test_send_message_releases_in_flight_slot_when_run_fails(self):
+        inflight = {}
+
+        with (
+            patch("backend.main._inflight_messages", new=inflight),
+            patch(
+                "backend.main.extract_message_content_and_files",
+                new=AsyncMock(return_value=("", [])),
+            ),
+        ):
+            with self.assertRaises(HTTPException) as raised:
+                await main.send_message(
+                    conversation_id="conv-1",
+                    http_request=object(),
+                    user_timezone="UTC",
+                    user=self._free_user(),
+                )
+
+        self.assertEqual(raised.exception.status_code, 400)
+        self.assertEqual(inflight, {})
+
+    async def test_send_message_stream_rejects_before_reading_uploads(self):
+        extract_mock = AsyncMock(return_value=("Hello", []))
+        inflight = {
+            "user-free-1": {
+                f"req-{index}": time.monotonic()
+                for index in range(main.MAX_INFLIGHT_MESSAGES_PER_USER)
+            }
+        }
+
+        with (
+            patch("backend.main._inflight_messages", new=inflight),
+            patch("backend.main.extract_message_content_and_files", new=extract_mock),
+        ):
+            with self.assertRaises(HTTPException) as raised:
+                await main.send_message_stream(
+                    conversation_id="conv-1",
+                    http_request=object(),
+                    user_timezone="UTC",
+                    user=self._free_user(),
+                )
+
+        self.assertEqual(raised.exception.status_code, 429)
+        extract_mock.assert_not_awaited()
+
+    async def test_send_message_stream_releases_slot_when_setup_fails(self):
+        inflight = {}
+
+        with (
+            patch("backend.main._inflight_messages", new=inflight),
+            patch(
+                "backend.main.extract_message_content_and_files",
+                new=AsyncMock(return_value=("Hello", [])),
+            ),
+            patch(
+                "backend.main.get_owned_conversation",
+                new=AsyncMock(side_effect=HTTPException(status_code=404)),
+            ),
+        ):
+            with self.assertRaises(HTTPException):
+                await main.send_message_stream(
+                    conversation_id="conv-1",
+                    http_request=object(),
+                    user_timezone="UTC",
+                    user=self._free_user(),
+                )
+
+        self.assertEqual(inflight, {})
+
+    async def test_send_message_stream_background_releases_slot_of_unread_body(self):
+        inflight = {}
+
+        with (
+            patch("backend.main._inflight_messages", new=inflight),
+            patch(
+                "backend.main.extract_message_content_and_files",
+                new=AsyncMock(return_value=("Continue", [])),
+            ),
+            patch(
+                "backend.main.get_owned_conversation",
+                new=AsyncMock(
+                    return_value={
+                        "id": "conv-1",
+                        "messages": [{"role": "user", "content": "Earlier message"}],
+                    }
+                ),
+            ),
+            patch(
+                "backend.main.prepare_uploaded_files_for_model",
+                new=AsyncMock(return_value=([], [], False)),
+            ),
+            patch("backend.main.resolve_message_prompt", return_value="Continue"),
+        ):
+            response = await main.send_message_stream(
+                conversation_id="conv-1",
+                http_request=object(),
+                user_timezone="UTC",
+                user=self._free_user(),
+            )
+            self.assertEqual(len(inflight["user-free-1"]), 1)
+            await response.background()
+
+        self.assertEqual(inflight, {})
+
+    async def test_send_message_counts_model_calls_consistently_for_cached_title(self):
+        call_usage = {"input_tokens": 6, "output_tokens": 4, "total_tokens": 10, "cost": 0.001}
+        stage1_results = [{"model": "openai/gpt-5-nano", "response": "ok", "usage": call_usage}]
+        stage3_result = {"model": "openai/gpt-5-nano", "response": "final", "usage": call_usage}
+        append_turn_mock = AsyncMock(return_value=main.empty_usage_summary())
+
+        with (
+            patch(
+                "backend.main.extract_message_content_and_files",
+                new=AsyncMock(return_value=("Hello", [])),
+            ),
+            patch(
+                "backend.main.get_owned_conversation",
+                new=AsyncMock(return_value={"id": "conv-1", "messages": []}),
+            ),
+            patch("backend.main._get_remaining_daily_tokens", new=AsyncMock(return_value=200000)),
+            patch(
+                "backend.main.prepare_uploaded_files_for_model",
+                new=AsyncMock(return_value=([], [], False)),
+            ),
+            patch("backend.main.resolve_message_prompt", return_value="Hello"),
+            patch(
+                "backend.main.generate_conversation_title",
+                new=AsyncMock(
+                    return_value={"title": "Cached", "usage": main.empty_usage_summary()}
+                ),
+            ),
+            patch(
+                "backend.main.stage1_collect_responses",
+                new=AsyncMock(return_value=stage1_results),
+            ),
+            patch("backend.main.stage2_collect_rankings", new=AsyncMock(return_value=([], {}))),
+            patch(
+                "backend.main.stage3_synthesize_final",
+                new=AsyncMock(return_value=stage3_result),
+            ),
+            patch(
+                "backend.main.storage.consume_account_tokens",
+                new=AsyncMock(return_value=199980),
+            ),
+            patch("backend.main.storage.append_turn", new=append_turn_mock),
+            patch("backend.main.storage.update_conversation_title", new=AsyncMock()),
+        ):
+            result = await main.send_message(
+                conversation_id="conv-1",
+                http_request=object(),
+                user_timezone="UTC",
+                user=self._pro_user(),
+            )
+
+        persisted_stage1, persisted_stage2, persisted_stage3 = append_turn_mock.await_args.args[3:6]
+        stored_usage = storage._calculate_message_usage(
+            persisted_stage1, persisted_stage2, persisted_stage3
+        )
+        self.assertEqual(result["metadata"]["usage"]["model_calls"], 2)
+        self.assertEqual(stored_usage["model_calls"], result["metadata"]["usage"]["model_calls"])
+
+    async def test_send_message_keeps_user_message_and_cancels_title_when_turn_fails(self):
+        title_cancelled = asyncio.Event()
+
+        async def slow_title(*args, **kwargs):
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                title_cancelled.set()
+                raise
+
+        async def stage1(*args, **kwargs):
+            await asyncio.sleep(0)  # Let the title task start.
+            return [{"model": "m", "response": "ok", "usage": main.empty_usage_summary()}]
+
+        add_user_message_mock = AsyncMock()
+        append_turn_mock = AsyncMock()
+
+        with (
+            patch(
+                "backend.main.extract_message_content_and_files",
+                new=AsyncMock(return_value=("Hello", [])),
+            ),
+            patch(
+                "backend.main.get_owned_conversation",
+                new=AsyncMock(return_value={"id": "conv-1", "messages": []}),
+            ),
+            patch("backend.main._get_remaining_daily_tokens", new=AsyncMock(return_value=200000)),
+            patch(
+                "backend.main.prepare_uploaded_files_for_model",
+                new=AsyncMock(return_value=([], [], False)),
+            ),
+            patch("backend.main.resolve_message_prompt", return_value="Hello"),
+            patch("backend.main.generate_conversation_title", new=slow_title),
+            patch("backend.main.stage1_collect_responses", new=stage1),
+            patch(
+                "backend.main.stage2_collect_rankings",
+                new=AsyncMock(side_effect=RuntimeError("stage2 failed")),
+            ),
+            patch("backend.main.storage.add_user_message", new=add_user_message_mock),
+            patch("backend.main.storage.append_turn", new=append_turn_mock),
+        ):
+            with self.assertRaises(RuntimeError):
+                await main.send_message(
+                    conversation_id="conv-1",
+                    http_request=object(),
+                    user_timezone="UTC",
+                    user=self._pro_user(),
+                )
+
+        self.assertTrue(title_cancelled.is_set())
+        append_turn_mock.assert_not_awaited()
+        add_user_message_mock.assert_awaited_once()
+        self.assertEqual(add_user_message_mock.await_args.args[:3], ("conv-1", "user-pro-1", "Hello"))
+
+    async def test_send_message_stream_stops_title_write_when_quota_accounting_fails(self):
+        title_write_cancelled = asyncio.Event()
+
+        async def slow_title_write(*args, **kwargs):
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                title_write_cancelled.set()
+                raise
+
+        async def drained_balance(*args, **kwargs):
+            await asyncio.sleep(0)  # Let the title write start.
+            raise ValueError("INSUFFICIENT_CREDITS")
+
+        call_usage = {"total_tokens": 10, "cost": 0.001}
+        append_turn_mock = AsyncMock()
+
+        with (
+            patch(
+                "backend.main.extract_message_content_and_files",
+                new=AsyncMock(return_value=("Hello", [])),
+            ),
+            patch(
+                "backend.main.get_owned_conversation",
+                new=AsyncMock(return_value={"id": "conv-1", "messages": []}),
+            ),
+            patch("backend.main._get_remaining_daily_tokens", new=AsyncMock(return_value=200000)),
+            patch(
+                "backend.main.prepare_uploaded_files_for_model",
+                new=AsyncMock(return_value=([], [], False)),
+            ),
+            patch("backend.main.resolve_message_prompt", return_value="Hello"),
+            patch(
+                "backend.main.generate_conversation_title",
+                new=AsyncMock(return_value={"title": "Title", "usage": call_usage}),
+            ),
+            patch(
+                "backend.main.stage1_collect_responses",
+                new=AsyncMock(return_value=[{"model": "m", "response": "ok", "usage": call_usage}]),
+            ),
+            patch("backend.main.stage2_collect_rankings", new=AsyncMock(return_value=([], {}))),
+            patch(
+                "backend.main.stage3_synthesize_final",
+                new=AsyncMock(return_value={"model": "m", "response": "final", "usage": call_usage}),
+            ),
+            patch("backend.main.storage.consume_account_tokens", new=drained_balance),
+            patch("backend.main.storage.update_conversation_title", new=slow_title_write),
+            patch("backend.main.storage.add_user_message", new=AsyncMock()),
+            patch("backend.main.storage.append_turn", new=append_turn_mock),
+        ):
+            response = await main.send_message_stream(
+                conversation_id="conv-1",
+                http_request=self._request_stub(),
+                user_timezone="UTC",
+                user=self._pro_user(),
+            )
+            events = [chunk async for chunk in response.body_iterator]
+
+        self.assertIn(b'"type":"error"', events[-1])
+        self.assertTrue(title_write_cancelled.is_set())
+        append_turn_mock.assert_not_awaited()
+
+    async def test_send_message_waits_for_title_write_before_raising_persist_error(self):
+        title_write_finished = asyncio.Event()
+
+        async def title_write(*args, **kwargs):
+            await asyncio.sleep(0.05)
+            title_write_finished.set()
+
+        with (
+            patch(
+                "backend.main.extract_message_content_and_files",
+                new=AsyncMock(return_value=("Hello", [])),
+            ),
+            patch(
+                "backend.main.get_owned_conversation",
+                new=AsyncMock(return_value={"id": "conv-1", "messages": []}),
+            ),
+            patch("backend.main._get_remaining_daily_tokens", new=AsyncMock(return_value=200000)),
+            patch(
+                "backend.main.prepare_uploaded_files_for_model",
+                new=AsyncMock(return_value=([], [], False)),
+            ),
+            patch("backend.main.resolve_message_prompt", return_value="Hello"),
+            patch(
+                "backend.main.generate_conversation_title",
+                new=AsyncMock(
+                    return_value={"title": "Title", "usage": main.empty_usage_summary()}
+                ),
+            ),
+            patch(
+                "backend.main.stage1_collect_responses",
+                new=AsyncMock(
+                    return_value=[
+                        {"model": "m", "response": "ok", "usage": main.empty_usage_summary()}
+                    ]
+                ),
+            ),
+            patch("backend.main.stage2_collect_rankings", new=AsyncMock(return_value=([], {}))),
+            patch(
+                "backend.main.stage3_synthesize_final",
+                new=AsyncMock(
+                    return_value={
+                        "model": "m",
+                        "response": "final",
+                        "usage": main.empty_usage_summary(),
+                    }
+                ),
+            ),
+            patch("backend.main.storage.consume_account_tokens", new=AsyncMock(return_value=1)),
+            patch("backend.main.storage.update_conversation_title", new=title_write),
+            patch("backend.main.storage.add_user_message", new=AsyncMock()),
+            patch(
+                "backend.main.storage.append_turn",
+                new=AsyncMock(side_effect=RuntimeError("insert failed")),
+            ),
+        ):
+            with self.assertRaises(RuntimeError):
+                await main.send_message(
+                    conversation_id="conv-1",
+                    http_request=object(),
+                    user_timezone="UTC",
+                    user=self._pro_user(),
+                )
+
+        self.assertTrue(title_write_finished.is_set())
 
 if __name__ == "__main__":
     unittest.main()
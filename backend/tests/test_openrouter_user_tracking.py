@@ -1,23 +1,26 @@
 """Tests for OpenRouter user attribution propagation."""
 
+import asyncio
 import unittest
 from unittest.mock import AsyncMock, patch
 
+import orjson
+
 from backend import main
 from backend.services.openrouter import client as openrouter
 
 
 class _RequestStub:
-    async def is_disconnected(self):
-        return False
+    async def receive(self):
+        # Client stays connected for the whole stream.
+        await asyncio.Event().wait()
 
 
 class _FakeResponse:
-    def raise_for_status(self):
-        return None
-
-    def json(self):
-        return {
+    status_code = 200
+    headers: dict = {}
+    content = orjson.dumps(
+        {
             "choices": [
                 {
                     "message": {
@@ -32,6 +35,10 @@ class _FakeResponse:
                 "total_tokens": 2,
             },
         }
+    )
+
+    def raise_for_status(self):
+        return None
 
 
 class OpenRouterPayloadTests(unittest.IsolatedAsyncioTestCase):
@@ -39,24 +46,15 @@ class OpenRouterPayloadTests(unittest.IsolatedAsyncioTestCase):
         captured: dict = {}
 
         class FakeAsyncClient:
-            def __init__(self, timeout):
-                self.timeout = timeout
-
-            async def __aenter__(self):
-                return self
-
-            async def __aexit__(self, exc_type, exc, tb):
-                return False
-
-            async def post(self, url, headers=None, json=None):
+            async def post(self, url, headers=None, content=None, timeout=None):
                 captured["url"] = url
                 captured["headers"] = headers
-                captured["json"] = json
+                captured["json"] = orjson.loads(content)
                 return _FakeResponse()
 
         with patch(
-            "backend.services.openrouter.client.httpx.AsyncClient",
-            new=FakeAsyncClient,
+            "backend.services.openrouter.client.get_openrouter_client",
+            return_value=FakeAsyncClient(),
         ):
             result = await openrouter.query_model(
                 "openai/gpt-5.1",
@@ -71,22 +69,13 @@ class OpenRouterPayloadTests(unittest.IsolatedAsyncioTestCase):
         captured: dict = {}
 
         class FakeAsyncClient:
-            def __init__(self, timeout):
-                self.timeout = timeout
-
-            async def __aenter__(self):
-                return self
-
-            async def __aexit__(self, exc_type, exc, tb):
-                return False
-
-            async def post(self, url, headers=None, json=None):
-                captured["json"] = json
+            async def post(self, url, headers=None, content=None, timeout=None):
+                captured["json"] = orjson.loads(content)
                 return _FakeResponse()
 
         with patch(
-            "backend.services.openrouter.client.httpx.AsyncClient",
-            new=FakeAsyncClient,
+            "backend.services.openrouter.client.get_openrouter_client",
+            return_value=FakeAsyncClient(),
         ):
             await openrouter.query_model(
                 "openai/gpt-5.1",
@@ -96,6 +85,135 @@ class OpenRouterPayloadTests(unittest.IsolatedAsyncioTestCase):
 
         self.assertNotIn("user", captured["json"])
 
+    async def test_query_model_marks_conversation_prefix_for_explicit_cache_models(self):
+        captured: dict = {}
+
+        class FakeAsyncClient:
+            async def post(self, url, headers=None, content=None, timeout=None):
+                captured["json"] = orjson.loads(content)
+                return _FakeResponse()
+
+        messages = [
+            {"role": "system", "content": "Stay on topic."},
+            {"role": "user", "content": "Earlier question"},
+            {"role": "assistant", "content": "Earlier answer"},
+            {"role": "user", "content": "Follow-up"},
+        ]
+
+        with patch(
+            "backend.services.openrouter.client.get_openrouter_client",
+            return_value=FakeAsyncClient(),
+        ):
+            await openrouter.query_model("anthropic/claude-sonnet-4", messages)
+            anthropic_messages = captured["json"]["messages"]
+            await openrouter.query_model("openai/gpt-5.1", messages)
+            openai_messages = captured["json"]["messages"]
+
+        self.assertEqual(
+            anthropic_messages[2]["content"],
+            [
+                {
+                    "type": "text",
+                    "text": "Earlier answer",
+                    "cache_control": {"type": "ephemeral"},
+                }
+            ],
+        )
+        self.assertEqual(anthropic_messages[3], messages[3])
+        self.assertEqual(openai_messages, messages)
+        self.assertEqual(messages[2]["content"], "Earlier answer")
+
+    async def test_query_model_retries_throttled_requests_before_succeeding(self):
+        class ThrottledResponse:
+            status_code = 429
+            headers = {"Retry-After": "1"}
+
+            def raise_for_status(self):
+                raise AssertionError("throttled responses should be retried")
+
+        responses = [ThrottledResponse(), _FakeResponse()]
+
+        class FakeAsyncClient:
+            async def post(self, url, headers=None, content=None, timeout=None):
+                return responses.pop(0)
+
+        sleep_mock = AsyncMock()
+        with (
+            patch(
+                "backend.services.openrouter.client.get_openrouter_client",
+                return_value=FakeAsyncClient(),
+            ),
+            patch("backend.services.openrouter.client.asyncio.sleep", new=sleep_mock),
+        ):
+            result = await openrouter.query_model(
+                "openai/gpt-5.1",
+                [{"role": "user", "content": "Hello"}],
+            )
+
+        self.assertEqual(result["content"], "ok")
+        sleep_mock.assert_awaited_once_with(1.0)
+
+    async def test_query_model_gives_up_after_bounded_retries(self):
+        calls = []
+
+        class UnavailableResponse:
+            status_code = 503
+            headers: dict = {}
+
+            def raise_for_status(self):
+                raise RuntimeError("503 Service Unavailable")
+
+        class FakeAsyncClient:
+            async def post(self, url, headers=None, content=None, timeout=None):
+                calls.append(url)
+                return UnavailableResponse()
+
+        with (
+            patch(
+                "backend.services.openrouter.client.get_openrouter_client",
+                return_value=FakeAsyncClient(),
+            ),
+            patch("backend.services.openrouter.client.asyncio.sleep", new=AsyncMock()),
+        ):
+            result = await openrouter.query_model(
+                "openai/gpt-5.1",
+                [{"role": "user", "content": "Hello"}],
+            )
+
+        self.assertIsNone(result)
+        self.assertEqual(len(calls), 3)
+
+    async def test_query_models_parallel_respects_shared_request_cap(self):
+        in_flight = 0
+        peak_in_flight = 0
+
+        class FakeAsyncClient:
+            async def post(self, url, headers=None, content=None, timeout=None):
+                nonlocal in_flight, peak_in_flight
+                in_flight += 1
+                peak_in_flight = max(peak_in_flight, in_flight)
+                await asyncio.sleep(0)
+                in_flight -= 1
+                return _FakeResponse()
+
+        with (
+            patch(
+                "backend.services.openrouter.client.get_openrouter_client",
+                return_value=FakeAsyncClient(),
+            ),
+            patch(
+                "backend.services.openrouter.client._request_semaphore",
+                new=asyncio.Semaphore(2),
+            ),
+        ):
+            responses = await openrouter.query_models_parallel(
+                ["model/a", "model/b", "model/c", "model/d"],
+                [{"role": "user", "content": "Hello"}],
+            )
+
+        self.assertTrue(all(response is not None for response in responses.values()))
+        self.assertEqual(peak_in_flight, 2)
+
     async def test_query_models_parallel_forwards_openrouter_user(self):
         query_model_mock = AsyncMock(
             return_value={
@@ -235,7 +353,7 @@ class OpenRouterEndpointPropagationTests(unittest.IsolatedAsyncioTestCase):
             patch("backend.main.stage1_collect_responses", new=stage1_mock),
             patch("backend.main.stage2_collect_rankings", new=stage2_mock),
             patch("backend.main.stage3_synthesize_final", new=stage3_mock),
-            patch("backend.main.storage.add_assistant_message", new=AsyncMock()),
+            patch("backend.main.storage.append_turn", new=AsyncMock()),
             patch("backend.main.storage.get_conversation", new=AsyncMock(return_value={})),
         ):
             await main.send_message(
@@ -308,7 +426,7 @@ class OpenRouterEndpointPropagationTests(unittest.IsolatedAsyncioTestCase):
             patch("backend.main.stage1_collect_responses", new=stage1_mock),
             patch("backend.main.stage2_collect_rankings", new=stage2_mock),
             patch("backend.main.stage3_synthesize_final", new=stage3_mock),
-            patch("backend.main.storage.add_assistant_message", new=AsyncMock()),
+            patch("backend.main.storage.append_turn", new=AsyncMock()),
             patch("backend.main.storage.get_conversation", new=AsyncMock(return_value={})),
         ):
             response = await main.send_message_stream(
@@ -386,7 +504,7 @@ class OpenRouterEndpointPropagationTests(unittest.IsolatedAsyncioTestCase):
             patch("backend.main.stage1_collect_responses", new=stage1_mock),
             patch("backend.main.stage2_collect_rankings", new=stage2_mock),
             patch("backend.main.stage3_synthesize_final", new=stage3_mock),
-            patch("backend.main.storage.add_assistant_message", new=AsyncMock()),
+            patch("backend.main.storage.append_turn", new=AsyncMock()),
             patch("backend.main.storage.get_conversation", new=AsyncMock(return_value={})),
         ):
             await main.send_message(
@@ -455,7 +573,7 @@ class OpenRouterEndpointPropagationTests(unittest.IsolatedAsyncioTestCase):
             patch("backend.main.stage1_collect_responses", new=stage1_mock),
             patch("backend.main.stage2_collect_rankings", new=stage2_mock),
             patch("backend.main.stage3_synthesize_final", new=stage3_mock),
-            patch("backend.main.storage.add_assistant_message", new=AsyncMock()),
+            patch("backend.main.storage.append_turn", new=AsyncMock()),
             patch("backend.main.storage.get_conversation", new=AsyncMock(return_value={})),
         ):
             response = await main.send_message_stream(
@@ -0,0 +1,118 @@
+"""Tests for Stage 2 ranking parsing and aggregation."""
+
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from backend.stages import stage2
+
+
+class ParseRankingFromTextTests(unittest.TestCase):
+    def test_numbered_final_ranking_returns_labels_in_order(self):
+        text = (
+            "Response A is thorough. Response B misses context.\n\n"
+            "FINAL RANKING:\n1. Response C\n2. Response A\n3. Response B"
+        )
+        self.assertEqual(
+            stage2.parse_ranking_from_text(text),
+            ["Response C", "Response A", "Response B"],
+        )
+
+    def test_numbered_entries_win_over_prose_mentions_in_final_ranking(self):
+        text = (
+            "FINAL RANKING:\nResponse B edges out the rest.\n"
+            "1. Response B\n2. Response A"
+        )
+        self.assertEqual(
+            stage2.parse_ranking_from_text(text),
+            ["Response B", "Response A"],
+        )
+
+    def test_repeated_marker_uses_last_final_ranking(self):
+        text = (
+            "The format asks for:\nFINAL RANKING:\n1. Response A\n2. Response B\n\n"
+            "My evaluation...\n\nFINAL RANKING:\n1. Response B\n2. Response A"
+        )
+        self.assertEqual(
+            stage2.parse_ranking_from_text(text),
+            ["Response B", "Response A"],
+        )
+
+    def test_unnumbered_final_ranking_falls_back_to_label_order(self):
+        text = "Evaluation...\nFINAL RANKING:\nResponse B, then Response A"
+        self.assertEqual(
+            stage2.parse_ranking_from_text(text),
+            ["Response B", "Response A"],
+        )
+
+    def test_missing_final_ranking_scans_whole_text(self):
+        text = "I prefer Response B over Response A."
+        self.assertEqual(
+            stage2.parse_ranking_from_text(text),
+            ["Response B", "Response A"],
+        )
+
+
+class CalculateAggregateRankingsTests(unittest.TestCase):
+    def test_average_rank_orders_models(self):
+        label_to_model = {"Response A": "model/a", "Response B": "model/b"}
+        stage2_results = [
+            {"model": "model/a", "ranking": "FINAL RANKING:\n1. Response B\n2. Response A"},
+            {"model": "model/b", "ranking": "FINAL RANKING:\n1. Response B\n2. Response A"},
+        ]
+
+        aggregate = stage2.calculate_aggregate_rankings(stage2_results, label_to_model)
+
+        self.assertEqual(
+            aggregate,
+            [
+                {"model": "model/b", "average_rank": 1.0, "rankings_count": 2},
+                {"model": "model/a", "average_rank": 2.0, "rankings_count": 2},
+            ],
+        )
+
+
+    def test_prefers_parsed_ranking_from_stage2_results(self):
+        label_to_model = {"Response A": "model/a", "Response B": "model/b"}
+        stage2_results = [
+            {
+                "model": "model/a",
+                "ranking": "unparseable prose",
+                "parsed_ranking": ["Response A", "Response B"],
+            }
+        ]
+
+        aggregate = stage2.calculate_aggregate_rankings(stage2_results, label_to_model)
+
+        self.assertEqual([row["model"] for row in aggregate], ["model/a", "model/b"])
+
+
+
+class Stage2CollectRankingsTests(unittest.IsolatedAsyncioTestCase):
+    async def test_anonymizes_stage1_answers_with_sequential_labels(self):
+        stage1_results = [
+            {"model": "model/a", "response": "First"},
+            {"model": "model/b", "response": "Second"},
+        ]
+        query_mock = AsyncMock(
+            return_value={
+                "model/a": {"content": "FINAL RANKING:\n1. Response B\n2. Response A"},
+                "model/b": None,
+            }
+        )
+
+        with patch("backend.stages.stage2.query_models_parallel", new=query_mock):
+            results, label_to_model = await stage2.stage2_collect_rankings(
+                "Question?",
+                stage1_results,
+                council_models=["model/a", "model/b"],
+            )
+
+        self.assertEqual(label_to_model, {"Response A": "model/a", "Response B": "model/b"})
+        prompt = query_mock.await_args.args[1][0]["content"]
+        self.assertIn("Response A:\nFirst\n\nResponse B:\nSecond", prompt)
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]["parsed_ranking"], ["Response B", "Response A"])
+
+
+if __name__ == "__main__":
+    unittest.main()
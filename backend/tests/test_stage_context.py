@@ -0,0 +1,32 @@
+"""Tests for rendering conversation history into stage prompts."""
+
+import unittest
+
+from backend.stages.shared import history_to_context_text
+
+
+class HistoryToContextTextTests(unittest.TestCase):
+    def test_renders_user_and_assistant_turns_only(self):
+        history = [
+            {"role": "system", "content": "ignored"},
+            {"role": "user", "content": "  Hi  "},
+            {"role": "assistant", "content": "Hello"},
+            {"role": "user", "content": "   "},
+            "not-a-dict",
+        ]
+        self.assertEqual(history_to_context_text(history), "User: Hi\n\nAssistant: Hello")
+
+    def test_long_history_keeps_the_newest_max_chars(self):
+        history = [
+            {"role": "user", "content": "a" * 40},
+            {"role": "assistant", "content": "b" * 40},
+            {"role": "user", "content": "latest"},
+        ]
+        full_text = f"User: {'a' * 40}\n\nAssistant: {'b' * 40}\n\nUser: latest"
+
+        self.assertEqual(history_to_context_text(history, max_chars=30), f"...{full_text[-30:]}")
+        self.assertEqual(history_to_context_text(history, max_chars=len(full_text)), full_text)
+
+
+if __name__ == "__main__":
+    unittest.main()
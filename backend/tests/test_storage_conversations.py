@@ -0,0 +1,209 @@
+"""Tests for Supabase conversation storage round trips."""
+
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from backend.services.supabase import storage
+
+
+class UserMessageContentTests(unittest.TestCase):
+    def test_round_trips_text_and_file_metadata(self):
+        files = [{"name": "relatório.pdf", "kind": "pdf", "mime_type": "application/pdf", "size_bytes": 12}]
+
+        encoded = storage._encode_user_message_content('Olá "mundo"', files)
+
+        self.assertTrue(encoded.startswith(storage.USER_MESSAGE_PAYLOAD_PREFIX))
+        self.assertEqual(
+            storage._decode_user_message_content(encoded), ('Olá "mundo"', files)
+        )
+
+    def test_malformed_payload_falls_back_to_raw_text(self):
+        raw = f"{storage.USER_MESSAGE_PAYLOAD_PREFIX}{{not json"
+
+        self.assertEqual(storage._decode_user_message_content(raw), (raw, []))
+
+
+class MessageUsageTests(unittest.TestCase):
+    def test_sums_stage_usage_with_mixed_value_types(self):
+        usage = storage._calculate_message_usage(
+            [{"usage": {"input_tokens": 10, "output_tokens": "5", "total_tokens": 15, "cost": 0.001}}],
+            [{"usage": {"input_tokens": None, "output_tokens": 2.9, "total_cost": "0.002"}}, "bad"],
+            {"usage": {"total_tokens": 7}, "title_usage": None},
+        )
+
+        self.assertEqual(
+            usage,
+            {
+                "input_tokens": 10,
+                "output_tokens": 7,
+                "total_tokens": 22,
+                "total_cost": 0.003,
+                "model_calls": 3,
+            },
+        )
+
+    def test_persisted_columns_override_stage_totals(self):
+        usage = storage._calculate_message_usage(
+            [{"usage": {"total_tokens": 5, "cost": 0.5}}], [], {}, 40, "0.25"
+        )
+
+        self.assertEqual(usage["total_tokens"], 40)
+        self.assertEqual(usage["total_cost"], 0.25)
+
+
+class GetConversationTests(unittest.IsolatedAsyncioTestCase):
+    async def test_loads_conversation_and_messages_in_one_rpc_call(self):
+        rest_mock = AsyncMock(
+            return_value={
+                "conversation": {
+                    "id": "conv-1",
+                    "created_at": "2026-02-20T08:00:00+00:00",
+                    "title": "Hello",
+                    "archived": False,
+                },
+                "messages": [{"role": "user", "id_session": "s-1", "content": "Hi"}],
+            }
+        )
+
+        with patch("backend.services.supabase.storage._rest_request", new=rest_mock):
+            conversation = await storage.get_conversation("conv-1", "user-1")
+
+        rest_mock.assert_awaited_once_with(
+            "POST",
+            "rpc/get_conversation_with_messages",
+            json_body={"p_conversation_id": "conv-1", "p_user_id": "user-1"},
+        )
+        self.assertEqual(conversation["title"], "Hello")
+        self.assertEqual(conversation["messages"][0]["content"], "Hi")
+        self.assertFalse(conversation["has_more"])
+        self.assertIsNone(conversation["next_before_id"])
+
+    async def test_paginated_load_reports_cursor_for_older_messages(self):
+        rest_mock = AsyncMock(
+            return_value={
+                "conversation": {
+                    "id": "conv-1",
+                    "created_at": "2026-02-20T08:00:00+00:00",
+                    "title": "Hello",
+                    "archived": False,
+                },
+                "messages": [
+                    {"id": 7, "role": "user", "content": "Older"},
+                    {"id": 8, "role": "user", "content": "Newer"},
+                    {"id": 9, "role": "user", "content": "Newest"},
+                ],
+            }
+        )
+
+        with patch("backend.services.supabase.storage._rest_request", new=rest_mock):
+            conversation = await storage.get_conversation(
+                "conv-1", "user-1", limit=2, before_id=10
+            )
+
+        self.assertEqual(
+            rest_mock.await_args.kwargs["json_body"],
+            {
+                "p_conversation_id": "conv-1",
+                "p_user_id": "user-1",
+                "p_limit": 3,
+                "p_before_id": 10,
+            },
+        )
+        self.assertEqual(
+            [message["content"] for message in conversation["messages"]],
+            ["Newer", "Newest"],
+        )
+        self.assertTrue(conversation["has_more"])
+        self.assertEqual(conversation["next_before_id"], 8)
+
+    async def test_returns_none_when_conversation_is_not_owned(self):
+        rest_mock = AsyncMock(return_value=None)
+
+        with patch("backend.services.supabase.storage._rest_request", new=rest_mock):
+            conversation = await storage.get_conversation("conv-1", "user-2")
+
+        self.assertIsNone(conversation)
+
+
+class ListConversationsTests(unittest.IsolatedAsyncioTestCase):
+    async def test_maps_summary_rpc_rows_to_sidebar_payload(self):
+        rest_mock = AsyncMock(
+            return_value=[
+                {
+                    "id": "conv-1",
+                    "created_at": "2026-02-20T08:00:00+00:00",
+                    "title": None,
+                    "archived": False,
+                    "message_count": 4,
+                    "total_tokens": 200,
+                    "total_cost": 0.00123457,
+                }
+            ]
+        )
+
+        with patch("backend.services.supabase.storage._rest_request", new=rest_mock):
+            conversations = await storage.list_conversations("user-1", archived=True)
+
+        rest_mock.assert_awaited_once_with(
+            "POST",
+            "rpc/list_conversation_summaries",
+            json_body={"p_user_id": "user-1", "p_archived": True},
+        )
+        self.assertEqual(
+            conversations,
+            [
+                {
+                    "id": "conv-1",
+                    "created_at": "2026-02-20T08:00:00+00:00",
+                    "title": "New Conversation",
+                    "archived": False,
+                    "message_count": 4,
+                    "usage": {"total_tokens": 200, "total_cost": 0.00123457},
+                }
+            ],
+        )
+
+
+class OwnedConversationMutationTests(unittest.IsolatedAsyncioTestCase):
+    async def test_append_turn_inserts_both_messages_in_one_owned_rpc_call(self):
+        rest_mock = AsyncMock(return_value=2)
+
+        with patch("backend.services.supabase.storage._rest_request", new=rest_mock):
+            await storage.append_turn(
+                "conv-1",
+                "user-1",
+                "Hi",
+                [{"model": "m", "response": "a"}],
+                [],
+                {"model": "m", "response": "final"},
+            )
+
+        rest_mock.assert_awaited_once()
+        method, resource = rest_mock.await_args.args
+        body = rest_mock.await_args.kwargs["json_body"]
+        self.assertEqual((method, resource), ("POST", "rpc/append_conversation_messages"))
+        self.assertEqual(body["p_user_id"], "user-1")
+        self.assertEqual(body["p_conversation_id"], "conv-1")
+        self.assertEqual([row["role"] for row in body["p_messages"]], ["user", "assistant"])
+
+    async def test_append_to_unowned_conversation_raises_value_error(self):
+        rest_mock = AsyncMock(side_effect=RuntimeError("CONVERSATION_NOT_FOUND"))
+
+        with patch("backend.services.supabase.storage._rest_request", new=rest_mock):
+            with self.assertRaises(ValueError):
+                await storage.add_user_message("conv-1", "user-2", "Hi")
+
+    async def test_title_update_without_matching_row_raises_value_error(self):
+        rest_mock = AsyncMock(return_value=[])
+
+        with patch("backend.services.supabase.storage._rest_request", new=rest_mock):
+            with self.assertRaises(ValueError):
+                await storage.update_conversation_title("conv-1", "user-2", "Title")
+
+        rest_mock.assert_awaited_once()
+        self.assertEqual(rest_mock.await_args.args, ("PATCH", "conversations"))
+        self.assertEqual(rest_mock.await_args.kwargs["prefer"], "return=representation")
+
+
+if __name__ == "__main__":
+    unittest.main()
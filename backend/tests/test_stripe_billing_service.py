@@ -1,9 +1,13 @@
 """Tests for Stripe billing services and API-layer delegation."""
 
+import hashlib
+import hmac
 import json
+import time
 import unittest
 from unittest.mock import AsyncMock, patch
 
+from cachetools import TTLCache
 from fastapi import HTTPException
 
 from backend import main
@@ -166,6 +170,37 @@ class StripeBillingServiceTests(unittest.IsolatedAsyncioTestCase):
             "2025-01-01T00:00:00+00:00",
         )
 
+    def _signed_header(self, payload: bytes, secret: bytes, timestamp: int) -> str:
+        digest = hmac.new(
+            secret, f"{timestamp}.".encode("ascii") + payload, hashlib.sha256
+        ).hexdigest()
+        return f"t={timestamp},v1={digest}"
+
+    async def test_verify_stripe_signature_accepts_only_fresh_matching_signatures(self):
+        payload = b'{"id":"evt_123"}'
+        now = int(time.time())
+
+        with (
+            patch("backend.services.stripe.billing.STRIPE_WEBHOOK_SECRET", "whsec_test"),
+            patch("backend.services.stripe.billing._WEBHOOK_SECRET_BYTES", b"whsec_test"),
+        ):
+            self.assertTrue(
+                billing.verify_stripe_signature(
+                    payload, self._signed_header(payload, b"whsec_test", now)
+                )
+            )
+            self.assertFalse(
+                billing.verify_stripe_signature(
+                    payload + b" ", self._signed_header(payload, b"whsec_test", now)
+                )
+            )
+            self.assertFalse(
+                billing.verify_stripe_signature(
+                    payload, self._signed_header(payload, b"whsec_test", now - 301)
+                )
+            )
+            self.assertFalse(billing.verify_stripe_signature(payload, "v1=abc"))
+
     async def test_process_stripe_webhook_acknowledges_payload_mismatch(self):
         webhook_payload = json.dumps(
             {
@@ -178,6 +213,10 @@ class StripeBillingServiceTests(unittest.IsolatedAsyncioTestCase):
         with (
             patch("backend.services.stripe.billing.STRIPE_WEBHOOK_SECRET", ""),
             patch("backend.services.stripe.billing.verify_stripe_signature", return_value=True),
+            patch(
+                "backend.services.stripe.billing._processed_event_ids",
+                new=TTLCache(maxsize=8, ttl=60),
+            ),
             patch(
                 "backend.services.stripe.billing.reconcile_checkout_session_to_plan",
                 new=AsyncMock(side_effect=HTTPException(status_code=400, detail="bad payload")),
@@ -187,6 +226,35 @@ class StripeBillingServiceTests(unittest.IsolatedAsyncioTestCase):
 
         self.assertEqual(result, {"received": True, "processed": False})
 
+    async def test_process_stripe_webhook_short_circuits_redelivered_events(self):
+        webhook_payload = json.dumps(
+            {
+                "id": "evt_456",
+                "type": "checkout.session.completed",
+                "data": {"object": {"id": "cs_456"}},
+            }
+        ).encode("utf-8")
+        reconcile_mock = AsyncMock(return_value={"plan": "pro"})
+
+        with (
+            patch("backend.services.stripe.billing.STRIPE_WEBHOOK_SECRET", ""),
+            patch("backend.services.stripe.billing.verify_stripe_signature", return_value=True),
+            patch(
+                "backend.services.stripe.billing._processed_event_ids",
+                new=TTLCache(maxsize=8, ttl=60),
+            ),
+            patch(
+                "backend.services.stripe.billing.reconcile_checkout_session_to_plan",
+                new=reconcile_mock,
+            ),
+        ):
+            first = await billing.process_stripe_webhook(webhook_payload, None)
+            second = await billing.process_stripe_webhook(webhook_payload, None)
+
+        self.assertEqual(first, {"received": True})
+        self.assertEqual(second, {"received": True, "duplicate": True})
+        reconcile_mock.assert_awaited_once()
+
 
 class StripeApiLayerDelegationTests(unittest.IsolatedAsyncioTestCase):
     async def test_create_pro_checkout_session_endpoint_delegates_to_service(self):
@@ -0,0 +1,163 @@
+"""Tests for cached Supabase access-token validation."""
+
+import base64
+import time
+import unittest
+from unittest.mock import patch
+
+import orjson
+from cachetools import TLRUCache
+from fastapi import HTTPException
+
+from backend.services.supabase import auth
+
+
+def _new_cache():
+    return TLRUCache(maxsize=8, ttu=auth._token_cache_ttu)
+
+
+def _jwt_with_exp(exp):
+    claims = base64.urlsafe_b64encode(orjson.dumps({"exp": exp})).rstrip(b"=").decode()
+    return f"header.{claims}.signature"
+
+
+class _FakeResponse:
+    def __init__(self, status_code, payload):
+        self.status_code = status_code
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+
+class _FakeAsyncClient:
+    def __init__(self, responses, calls):
+        self._responses = responses
+        self._calls = calls
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+    async def get(self, url, headers=None, **kwargs):
+        self._calls.append(("GET", url))
+        return self._responses.pop(0)
+
+    async def put(self, url, headers=None, json=None, **kwargs):
+        self._calls.append(("PUT", url))
+        return self._responses.pop(0)
+
+
+class SupabaseTokenCacheTests(unittest.IsolatedAsyncioTestCase):
+    def _patch_client(self, responses, calls):
+        return patch(
+            "backend.services.supabase.auth.httpx.AsyncClient",
+            new=lambda *args, **kwargs: _FakeAsyncClient(responses, calls),
+        )
+
+    async def test_get_user_from_token_reuses_validated_user(self):
+        calls = []
+        responses = [_FakeResponse(200, {"id": "user-1", "email": "a@example.com"})]
+
+        with (
+            patch(
+                "backend.services.supabase.auth._ensure_supabase_config",
+                return_value=("https://supabase.test", "key"),
+            ),
+            patch("backend.services.supabase.auth._token_user_cache", new=_new_cache()),
+            self._patch_client(responses, calls),
+        ):
+            first = await auth.get_user_from_token("token-1")
+            second = await auth.get_user_from_token("token-1")
+
+        self.assertEqual(first["id"], "user-1")
+        self.assertIs(second, first)
+        self.assertEqual(len(calls), 1)
+
+    async def test_get_user_from_token_does_not_cache_rejected_tokens(self):
+        calls = []
+        responses = [
+            _FakeResponse(401, {"msg": "invalid"}),
+            _FakeResponse(401, {"msg": "invalid"}),
+        ]
+
+        with (
+            patch(
+                "backend.services.supabase.auth._ensure_supabase_config",
+                return_value=("https://supabase.test", "key"),
+            ),
+            patch("backend.services.supabase.auth._token_user_cache", new=_new_cache()),
+            self._patch_client(responses, calls),
+        ):
+            for _ in range(2):
+                with self.assertRaises(HTTPException) as exc_info:
+                    await auth.get_user_from_token("bad-token")
+                self.assertEqual(exc_info.exception.status_code, 401)
+
+        self.assertEqual(len(calls), 2)
+
+    async def test_metadata_update_invalidates_cached_user(self):
+        calls = []
+        responses = [
+            _FakeResponse(200, {"id": "user-1", "app_metadata": {"plan": "free"}}),
+            _FakeResponse(200, {"user": {"id": "user-1", "app_metadata": {"plan": "pro"}}}),
+            _FakeResponse(200, {"id": "user-1", "app_metadata": {"plan": "pro"}}),
+        ]
+
+        with (
+            patch(
+                "backend.services.supabase.auth._ensure_supabase_config",
+                return_value=("https://supabase.test", "key"),
+            ),
+            patch("backend.services.supabase.auth._token_user_cache", new=_new_cache()),
+            self._patch_client(responses, calls),
+        ):
+            await auth.get_user_from_token("token-1")
+            await auth._update_user_app_metadata("user-1", {"plan": "pro"})
+            refreshed = await auth.get_user_from_token("token-1")
+
+        self.assertEqual(refreshed["app_metadata"]["plan"], "pro")
+        self.assertEqual([method for method, _ in calls], ["GET", "PUT", "GET"])
+
+
+    async def test_cache_entry_never_outlives_token_expiry(self):
+        calls = []
+        responses = [
+            _FakeResponse(200, {"id": "user-1"}),
+            _FakeResponse(200, {"id": "user-1"}),
+        ]
+        expired_token = _jwt_with_exp(int(time.time()) - 5)
+
+        with (
+            patch(
+                "backend.services.supabase.auth._ensure_supabase_config",
+                return_value=("https://supabase.test", "key"),
+            ),
+            patch("backend.services.supabase.auth._token_user_cache", new=_new_cache()) as cache,
+            self._patch_client(responses, calls),
+        ):
+            await auth.get_user_from_token(expired_token)
+            await auth.get_user_from_token(expired_token)
+            self.assertEqual(len(cache), 0)
+
+        self.assertEqual(len(calls), 2)
+
+    def test_ttu_caps_lifetime_at_token_expiry(self):
+        now = 1000.0
+        expiring_soon = ({"id": "user-1"}, time.time() + 5)
+        long_lived = ({"id": "user-1"}, time.time() + 3600)
+
+        self.assertLessEqual(auth._token_cache_ttu("k", expiring_soon, now), now + 5)
+        self.assertEqual(
+            auth._token_cache_ttu("k", long_lived, now),
+            now + auth.TOKEN_USER_CACHE_TTL_SECONDS,
+        )
+        self.assertEqual(
+            auth._token_cache_ttu("k", ({"id": "user-1"}, None), now),
+            now + auth.TOKEN_USER_CACHE_TTL_SECONDS,
+        )
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+"""Tests for the shared Supabase PostgREST request helper."""
+
+import unittest
+from unittest.mock import patch
+
+from backend.services.supabase import rest
+
+
+class _FakeResponse:
+    def __init__(self, status_code, content):
+        self.status_code = status_code
+        self.content = content
+
+
+class _FakeAsyncClient:
+    def __init__(self, responses):
+        self.responses = responses
+        self.calls = []
+
+    async def request(self, method, url, params=None, content=None, headers=None):
+        self.calls.append(
+            {"method": method, "url": url, "params": params, "content": content, "headers": headers}
+        )
+        return self.responses.pop(0)
+
+
+class RestRequestTests(unittest.IsolatedAsyncioTestCase):
+    async def test_requests_share_one_client_with_relative_resource_urls(self):
+        client = _FakeAsyncClient(
+            [_FakeResponse(200, b'[{"id": "c-1"}]'), _FakeResponse(201, b"")]
+        )
+
+        with patch(
+            "backend.services.supabase.rest.get_supabase_rest_client",
+            return_value=client,
+        ):
+            rows = await rest.rest_request(
+                "GET", "conversations", params={"id": "eq.c-1"}
+            )
+            created = await rest.rest_request(
+                "POST",
+                "messages",
+                json_body={"content": "hi"},
+                prefer="return=minimal",
+            )
+
+        self.assertEqual(rows, [{"id": "c-1"}])
+        self.assertIsNone(created)
+        self.assertEqual([call["url"] for call in client.calls], ["conversations", "messages"])
+        self.assertIsNone(client.calls[0]["headers"])
+        self.assertIsNone(client.calls[0]["content"])
+        self.assertEqual(client.calls[1]["content"], b'{"content":"hi"}')
+        self.assertEqual(
+            client.calls[1]["headers"],
+            {"Content-Type": "application/json", "Prefer": "return=minimal"},
+        )
+
+    async def test_error_status_raises_postgrest_message(self):
+        client = _FakeAsyncClient([_FakeResponse(400, b'{"message": "bad filter"}')])
+
+        with patch(
+            "backend.services.supabase.rest.get_supabase_rest_client",
+            return_value=client,
+        ):
+            with self.assertRaisesRegex(RuntimeError, "bad filter"):
+                await rest.rest_request("GET", "conversations")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+"""Tests for conversation title generation."""
+
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from cachetools import TTLCache
+
+from backend.stages import title
+
+
+class GenerateConversationTitleTests(unittest.IsolatedAsyncioTestCase):
+    async def test_repeated_first_message_reuses_cached_title_without_usage(self):
+        usage = {"input_tokens": 10, "output_tokens": 3, "total_tokens": 13, "cost": 0.001}
+        query_model_mock = AsyncMock(return_value={"content": ' "Paris Travel Tips" ', "usage": usage})
+
+        with (
+            patch("backend.stages.title._title_cache", new=TTLCache(maxsize=8, ttl=60)),
+            patch("backend.stages.title.query_model", new=query_model_mock),
+        ):
+            first = await title.generate_conversation_title("Tips for Paris?")
+            second = await title.generate_conversation_title("Tips for Paris?")
+
+        self.assertEqual(first, {"title": "Paris Travel Tips", "usage": usage})
+        self.assertEqual(second["title"], "Paris Travel Tips")
+        self.assertEqual(second["usage"]["total_tokens"], 0)
+        query_model_mock.assert_awaited_once()
+
+    async def test_failed_generation_is_not_cached(self):
+        query_model_mock = AsyncMock(return_value=None)
+
+        with (
+            patch("backend.stages.title._title_cache", new=TTLCache(maxsize=8, ttl=60)),
+            patch("backend.stages.title.query_model", new=query_model_mock),
+        ):
+            first = await title.generate_conversation_title("Hello")
+            await title.generate_conversation_title("Hello")
+
+        self.assertEqual(first["title"], "New Conversation")
+        self.assertEqual(query_model_mock.await_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,27 @@
+"""Tests for shared value coercion helpers."""
+
+import unittest
+
+from backend.utils import coerce_float, coerce_int
+
+
+class CoerceNumberTests(unittest.TestCase):
+    def test_coerce_int_keeps_int_conversion_semantics(self):
+        self.assertEqual(coerce_int(7), 7)
+        self.assertEqual(coerce_int("12"), 12)
+        self.assertEqual(coerce_int(3.9), 3)
+        self.assertEqual(coerce_int(True), 1)
+        self.assertEqual(coerce_int(None), 0)
+        self.assertEqual(coerce_int("1.5", default=-1), -1)
+        self.assertEqual(coerce_int({}, default=-1), -1)
+
+    def test_coerce_float_keeps_float_conversion_semantics(self):
+        self.assertEqual(coerce_float(0.25), 0.25)
+        self.assertEqual(coerce_float(2), 2.0)
+        self.assertEqual(coerce_float("0.5"), 0.5)
+        self.assertIsNone(coerce_float(None))
+        self.assertIsNone(coerce_float("n/a"))
+
+
+if __name__ == "__main__":
+    unittest.main()
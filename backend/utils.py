@@ -6,6 +6,11 @@ from typing import Any
 
 def coerce_int(value: Any, default: int = 0) -> int:
     """Best-effort integer conversion."""
+    # Decoded JSON mostly yields ints or nulls; skip the try block for those.
+    if type(value) is int:
+        return value
+    if value is None:
+        return default
     try:
         return int(value)
     except (TypeError, ValueError):
@@ -14,6 +19,10 @@ def coerce_int(value: Any, default: int = 0) -> int:
 
 def coerce_float(value: Any) -> float | None:
     """Best-effort float conversion."""
+    if type(value) is float:
+        return value
+    if value is None:
+        return None
     try:
         return float(value)
     except (TypeError, ValueError):
@@ -30,10 +39,16 @@ def normalize_session_id(value: Any, max_length: int = 128) -> str | None:
     return normalized[:max_length]
 
 
+_PLAN_SET = frozenset({"free", "pro"})
+
+
 def normalize_plan(value: Any) -> str:
     """Normalize plan text into accepted values."""
     if not isinstance(value, str):
         return "free"
+    # Stored metadata is already normalized; skip the strip/lower copies.
+    if value in _PLAN_SET:
+        return value
     normalized = value.strip().lower()
     if normalized == "pro":
         return "pro"